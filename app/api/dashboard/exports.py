@@ -0,0 +1,98 @@
+from datetime import date, datetime
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+
+from app.api.dashboard.router import (
+    USER_LIST_FIELDS, USER_SUBSCRIPTION_FIELDS, get_current_user, user_criteria, user_subscription_criteria,
+)
+from app.models.media import Media
+from app.models.user import User
+from app.models.user_subscription import UserSubscription
+from app.services import signing
+from app.services.exports import export_response
+from app.services.pagination import parse_fields, projection
+
+router = APIRouter()
+
+EXPORT_FORMAT = Query("ndjson", alias="format", pattern="^(ndjson|csv)$")
+
+MEDIA_EXPORT_FIELDS = {
+    "id": (Media.id, None),
+    "user_id": (Media.user_id, None),
+    "original_name": (Media.original_name, None),
+    "url": (Media.stored_path, signing.media_url),
+    "media_type": (Media.media_type, None),
+    "upload_date": (Media.upload_date, None),
+    "blob_hash": (Media.blob_hash, None),
+    "added_by": (Media.added_by, None),
+    "is_deleted": (Media.is_deleted, None),
+    "created_at": (Media.created_at, None),
+    "updated_at": (Media.updated_at, None),
+}
+
+
+@router.get("/export/users")
+def export_users(q: str | None = None, fields: str | None = None, fmt: str = EXPORT_FORMAT, gzip: bool = False, current_user: User = Depends(get_current_user)):
+    """
+    Stream every user matching the /users filters as NDJSON (default) or CSV.
+    Rows are read through a server-side cursor, so memory use does not grow
+    with the result; gzip=true returns a .gz file.
+    """
+    names = parse_fields(fields, USER_LIST_FIELDS)
+    stmt = select(*projection(USER_LIST_FIELDS, names, User.user_id)).where(*user_criteria(q)).order_by(User.user_id)
+    return export_response(stmt, USER_LIST_FIELDS, names, fmt, gzip, "users")
+
+
+@router.get("/export/user-subscriptions")
+def export_user_subscriptions(
+    q: str | None = None,
+    status: str | None = None,
+    is_deleted: bool | None = None,
+    start_from: datetime | None = None,
+    start_to: datetime | None = None,
+    active_at: datetime | None = None,
+    fields: str | None = None,
+    fmt: str = EXPORT_FORMAT,
+    gzip: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    """Stream user subscriptions matching the /user-subscriptions filters as NDJSON or CSV."""
+    names = parse_fields(fields, USER_SUBSCRIPTION_FIELDS)
+    stmt = (
+        select(*projection(USER_SUBSCRIPTION_FIELDS, names, UserSubscription.id))
+        .where(*user_subscription_criteria(q, status, is_deleted, start_from, start_to, active_at))
+        .order_by(UserSubscription.id)
+    )
+    return export_response(stmt, USER_SUBSCRIPTION_FIELDS, names, fmt, gzip, "user-subscriptions")
+
+
+@router.get("/export/media")
+def export_media(
+    user_id: int | None = None,
+    upload_date: date | None = Query(None, alias="date"),
+    date_from: date | None = None,
+    date_to: date | None = None,
+    is_deleted: bool = False,
+    fields: str | None = None,
+    fmt: str = EXPORT_FORMAT,
+    gzip: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Stream media rows as NDJSON or CSV.
+    Filters: user_id, date (exact upload date) or date_from / date_to
+    (inclusive), is_deleted (live rows by default). URLs are signed.
+    """
+    names = parse_fields(fields, MEDIA_EXPORT_FIELDS)
+    criteria = [Media.is_deleted == is_deleted]
+    if user_id is not None:
+        criteria.append(Media.user_id == user_id)
+    if upload_date is not None:
+        criteria.append(Media.upload_date == upload_date)
+    if date_from is not None:
+        criteria.append(Media.upload_date >= date_from)
+    if date_to is not None:
+        criteria.append(Media.upload_date <= date_to)
+    stmt = select(*projection(MEDIA_EXPORT_FIELDS, names, Media.id)).where(*criteria).order_by(Media.id)
+    return export_response(stmt, MEDIA_EXPORT_FIELDS, names, fmt, gzip, "media")
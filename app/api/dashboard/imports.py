@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+
+from app.api.dashboard.router import get_current_user
+from app.models.user import User
+from app.services.imports import import_users
+from app.services.responses import json_response
+
+router = APIRouter()
+
+_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def _import_format(file: UploadFile, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    name = (file.filename or "").lower()
+    for extension, inferred in _EXTENSIONS.items():
+        if name.endswith(extension):
+            return inferred
+    if (file.content_type or "").startswith("text/csv"):
+        return "csv"
+    raise HTTPException(status_code=400, detail="Cannot tell the file format, pass format=csv or format=ndjson")
+
+
+@router.post("/import/users")
+def import_users_file(
+    file: UploadFile = File(...),
+    fmt: str | None = Query(None, alias="format", pattern="^(ndjson|csv)$"),
+    dry_run: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Bulk-create users from a CSV (with a header row) or NDJSON file.
+    Columns: user_name, email, role, password, optional phone and active, and
+    optionally subscription_id with end_date (start_datetime and
+    payment_method default to now and "import") to add a subscription too.
+    Valid rows are created even when others fail. Returns counts, per-row
+    errors ({"row", "errors"}) and rows_per_second; dry_run=true only validates.
+    """
+    report = import_users(file.file, _import_format(file, fmt), current_user.user_id, dry_run)
+    return json_response(report)
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from app.models import SessionLocal
+from app.models import engine, get_db
+from app.models.pool import pool_status
+from app.models.async_session import fetch_all, fetch_first, get_read_db
+from app.config.config import settings
+from app.services.pagination import build_page, count_statement, decode_cursor, encode_cursor, keyset, parse_fields, projection, set_page_headers
+from app.services.catalog import CATALOG_VERSION_KEY, bump_version, get_catalog, subscription_catalog
+from app.services.http_cache import Conditional, collection_fingerprint, make_etag
+from app.services.responses import json_response
 from app.models.user import User
 from app.models.subscription import MasterSubscription
 from app.models.media import Media
@@ -9,28 +16,26 @@ from app.models.advertisement import Advertisement
 from fastapi import UploadFile, File, Form
 from typing import List as TypingList
 import os
-from pathlib import Path
 from datetime import datetime
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.api.dashboard.auth import get_password_hash
+from starlette.concurrency import run_in_threadpool
+from app.services import passwords
+from app.services.tokens import CachedUser, decode_access_token, get_token_user, invalidate_user, revoke_tokens, user_cache
+from app.services import blobs, derivatives, search, signing, stats
+from app.services.subscriptions import entitlement_cache, invalidate_entitlement
+from app.services.storage import UploadBudget, media_type_for
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 security = HTTPBearer()
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
-    token = credentials.credentials
-    user = db.query(User).filter(User.auth_token == token).first()
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> CachedUser:
+    # Verified from the token signature/claims; the user record comes from an
+    # in-process cache, so the common case issues no query.
+    claims = decode_access_token(credentials.credentials)
+    user = get_token_user(db, claims)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
     if user.role not in ("super_admin", "editor"):
@@ -43,38 +48,112 @@ def ping():
     return {"message": "Dashboard API is working"}
 
 
-@router.get("/users", response_model=List[dict])
-def list_users(q: str | None = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/diagnostics")
+def diagnostics(current_user: User = Depends(get_current_user)):
+    return {
+        "db_pool": pool_status(engine),
+        "auth_user_cache": user_cache.stats(),
+        "entitlement_cache": entitlement_cache.stats(),
+        "password_pool": passwords.stats(),
+        "search_index": search.stats(),
+        "subscription_catalog": subscription_catalog.stats(),
+    }
+
+
+@router.get("/stats")
+async def dashboard_stats(days: int = Query(30, ge=1, le=366), top: int = Query(10, ge=1, le=100), verify: bool = False, db=Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    """
+    Admin home page figures, read from the summary tables (no full-table scans):
+    active subscribers, subscriptions and revenue per plan, uploads per day for
+    the last ``days`` days, totals and the ``top`` subscribers by storage.
+    Revenue is live subscriptions times the plan's current price.
+    verify=true also recomputes the figures from the base tables (slow) and
+    reports any mismatch under "verify".
+    """
+    report = await stats.load(db, days, top)
+    catalog = await get_catalog()
+    revenue_total = 0.0
+    for plan in report["plans"]:
+        item = catalog.by_id.get(plan["subscription_id"])
+        price = item["price"] if item else None
+        plan["subscription_name"] = item["subscription_name"] if item else None
+        plan["price"] = price
+        plan["revenue"] = round(plan["subscriptions"] * price, 2) if price is not None else None
+        revenue_total += plan["revenue"] or 0
+    report["revenue_total"] = round(revenue_total, 2)
+    if verify:
+        report["verify"] = await stats.verify(db, report)
+    return json_response(report)
+
+
+
+@router.get("/search")
+async def dashboard_search(q: str = Query(..., min_length=1, max_length=100), types: str | None = None, limit: int = Query(10, ge=1, le=100), db=Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    """
+    Ranked search across users (name, email, phone), plans (name, description)
+    and live media (original name). Matches prefixes, substrings and small
+    typos; types is a comma-separated subset of users,plans,media (all by
+    default) and limit caps the hits returned per type.
+    """
+    query = q.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="q must not be blank")
+    names = [name.strip() for name in types.split(",") if name.strip()] if types else list(search.SEARCH_TYPES)
+    unknown = [name for name in names if name not in search.SEARCH_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(unknown)}")
+    return json_response(await search.search(db, query, dict.fromkeys(names), limit))
+
+
+USER_LIST_FIELDS = {
+    "user_id": (User.user_id, None),
+    "user_name": (User.user_name, None),
+    "email": (User.email, None),
+    "phone": (User.phone, None),
+    "role": (User.role, None),
+    "active": (User.active, None),
+    "created_at": (User.created_at, None),
+    "updated_at": (User.updated_at, None),
+}
+
+
+def user_criteria(q: str | None) -> list:
     # Only return users with role super_admin or editor
     allowed_roles = ("super_admin", "editor", "subscriber")
-    base_query = db.query(User).filter(User.role.in_(allowed_roles))
+    criteria = [User.role.in_(allowed_roles)]
 
     # If a search query `q` is provided, filter by user_name or email (case-insensitive)
     if q:
         pattern = f"%{q}%"
-        users = base_query.filter((User.user_name.ilike(pattern)) | (User.email.ilike(pattern))).all()
-    else:
-        users = base_query.all()
-    result = []
-    for u in users:
-        result.append({
-            "user_id": u.user_id,
-            "user_name": u.user_name,
-            "email": u.email,
-            "phone": u.phone,
-            "role": u.role,
-            "active": u.active,
-            "created_at": u.created_at,
-            "updated_at": u.updated_at,
-        })
-    return result
+        criteria.append((User.user_name.ilike(pattern)) | (User.email.ilike(pattern)))
+    return criteria
+
+
+@router.get("/users")
+async def list_users(request: Request, response: Response, q: str | None = None, limit: int | None = Query(None, ge=1, le=settings.PAGE_MAX_LIMIT), after: str | None = None, include_total: bool = False, fields: str | None = None, cond: Conditional = Depends(), db=Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    # Keyset pagination on user_id: pass the X-Next-Cursor header back as `after`
+    names = parse_fields(fields, USER_LIST_FIELDS)
+    criteria = user_criteria(q)
+    last_updated, count = await collection_fingerprint(db, User, *criteria)
+    not_modified = cond.evaluate(make_etag("users", request.url.query, last_updated, count))
+    if not_modified:
+        return not_modified
+    stmt = select(*projection(USER_LIST_FIELDS, names, User.user_id)).where(*criteria)
+    total = (await fetch_first(db, count_statement(stmt)))[0] if include_total else None
+    rows = await fetch_all(db, keyset(stmt, User.user_id, limit, after))
+    result, next_cursor = build_page(rows, USER_LIST_FIELDS, names, limit)
+    set_page_headers(request, response, next_cursor, total)
+    return json_response(result, response)
 
 
 @router.get("/users/{user_id}")
-def get_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_user(user_id: int, cond: Conditional = Depends(), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     u = db.query(User).filter(User.user_id == user_id).first()
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
+    not_modified = cond.evaluate(make_etag("user", u.user_id, u.updated_at), last_modified=u.updated_at)
+    if not_modified:
+        return not_modified
     return {
         "user_id": u.user_id,
         "user_name": u.user_name,
@@ -108,25 +187,39 @@ class UserUpdateSchema(BaseModel):
     active: bool | None = None
 
 
+def _find_existing_user(db: Session, user_name: str, email: str):
+    return db.query(User).filter((User.user_name == user_name) | (User.email == email)).first()
+
+
+def _save(db: Session, obj):
+    db.add(obj)
+    db.commit()
+    db.refresh(obj)
+
+
 @router.post("/users")
-def create_user(payload: UserCreateSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    existing = db.query(User).filter((User.user_name == payload.user_name) | (User.email == payload.email)).first()
+async def create_user(payload: UserCreateSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    existing = await run_in_threadpool(_find_existing_user, db, payload.user_name, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail="Username or email already exists")
-    hashed = get_password_hash(payload.password)
+    hashed = await passwords.hash_password(payload.password)
     # set active flag if provided (default True)
     new_user = User(user_name=payload.user_name, email=payload.email, phone=payload.phone, role=payload.role, password=hashed, active=payload.active if payload.active is not None else True)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await run_in_threadpool(_save, db, new_user)
     return {"user_id": new_user.user_id, "user_name": new_user.user_name, "email": new_user.email, "phone": new_user.phone, "role": new_user.role, "active": new_user.active}
 
 
-@router.put("/users/{user_id}")
-def update_user(user_id: int, payload: UserUpdateSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    u = db.query(User).filter(User.user_id == user_id).first()
-    if not u:
-        raise HTTPException(status_code=404, detail="User not found")
+def _find_user(db: Session, user_id: int):
+    return db.query(User).filter(User.user_id == user_id).first()
+
+
+def _apply_user_update(db: Session, u: User, payload: UserUpdateSchema, hashed: str | None):
+    # Changing credentials, role or active status revokes outstanding tokens
+    revoke = (
+        bool(hashed)
+        or (payload.role and payload.role != u.role)
+        or (payload.active is not None and payload.active != u.active)
+    )
     if payload.user_name:
         u.user_name = payload.user_name
     if payload.email:
@@ -135,12 +228,25 @@ def update_user(user_id: int, payload: UserUpdateSchema, db: Session = Depends(g
         u.phone = payload.phone
     if payload.role:
         u.role = payload.role
-    if payload.password:
-        u.password = get_password_hash(payload.password)
+    if hashed:
+        u.password = hashed
     if payload.active is not None:
         u.active = payload.active
+    if revoke:
+        revoke_tokens(db, u)
     db.commit()
+    invalidate_user(u.user_id)
     db.refresh(u)
+
+
+@router.put("/users/{user_id}")
+async def update_user(user_id: int, payload: UserUpdateSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    u = await run_in_threadpool(_find_user, db, user_id)
+    if not u:
+        raise HTTPException(status_code=404, detail="User not found")
+    # bcrypt runs on the bounded password pool (503 when it is saturated)
+    hashed = await passwords.hash_password(payload.password) if payload.password else None
+    await run_in_threadpool(_apply_user_update, db, u, payload, hashed)
     return {"user_id": u.user_id, "user_name": u.user_name, "email": u.email, "phone": u.phone, "role": u.role, "active": u.active}
 
 
@@ -151,6 +257,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: User
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(u)
     db.commit()
+    invalidate_user(user_id)
     return {"detail": "User deleted"}
 
 
@@ -177,50 +284,142 @@ class UserSubscriptionUpdateSchema(BaseModel):
     is_deleted: bool | None = None
 
 
-@router.get("/user-subscriptions")
-def list_user_subscriptions(q: str | None = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    base = db.query(UserSubscription)
+USER_SUBSCRIPTION_FIELDS = {
+    "id": (UserSubscription.id, None),
+    "user_id": (UserSubscription.user_id, None),
+    "subscription_id": (UserSubscription.subscription_id, None),
+    "start_datetime": (UserSubscription.start_datetime, None),
+    "end_date": (UserSubscription.end_date, None),
+    "payment_method": (UserSubscription.payment_method, None),
+    "is_deleted": (UserSubscription.is_deleted, None),
+    "subscription_status": (UserSubscription.subscription_status, None),
+    "added_by": (UserSubscription.added_by, None),
+    "created_at": (UserSubscription.created_at, None),
+    "updated_at": (UserSubscription.updated_at, None),
+}
+
+
+# Related records that can be embedded with ?expand=user,subscription, fetched
+# in the same joined query instead of one request per row.
+USER_SUBSCRIPTION_EXPANSIONS = {
+    "user": (User, UserSubscription.user_id == User.user_id, {
+        "user_id": (User.user_id, None),
+        "user_name": (User.user_name, None),
+        "email": (User.email, None),
+        "phone": (User.phone, None),
+        "role": (User.role, None),
+        "active": (User.active, None),
+    }),
+    "subscription": (MasterSubscription, UserSubscription.subscription_id == MasterSubscription.id, {
+        "id": (MasterSubscription.id, None),
+        "subscription_name": (MasterSubscription.subscription_name, None),
+        "description": (MasterSubscription.description, None),
+        "price": (MasterSubscription.price, float),
+        "duration": (MasterSubscription.duration, None),
+        "active": (MasterSubscription.active, None),
+    }),
+}
+
+
+def _parse_expand(expand: str | None) -> list[str]:
+    if not expand:
+        return []
+    names = [e.strip() for e in expand.split(",") if e.strip()]
+    unknown = [n for n in names if n not in USER_SUBSCRIPTION_EXPANSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown expand: {', '.join(unknown)}")
+    return names
+
+
+def _user_subscription_select(names: list[str], expand: list[str]):
+    columns = projection(USER_SUBSCRIPTION_FIELDS, names, UserSubscription.id)
+    for rel in expand:
+        fields = USER_SUBSCRIPTION_EXPANSIONS[rel][2]
+        columns.extend(col.label(f"{rel}__{name}") for name, (col, _) in fields.items())
+    stmt = select(*columns).select_from(UserSubscription)
+    for rel in expand:
+        model, onclause, _ = USER_SUBSCRIPTION_EXPANSIONS[rel]
+        stmt = stmt.outerjoin(model, onclause)
+    return stmt
+
+
+def _embed_expansions(rows, items: list[dict], expand: list[str]):
+    for row, item in zip(rows, items):
+        mapping = row._mapping
+        for rel in expand:
+            fields = USER_SUBSCRIPTION_EXPANSIONS[rel][2]
+            key = next(iter(fields))
+            if mapping[f"{rel}__{key}"] is None:
+                item[rel] = None
+                continue
+            nested = {}
+            for name, (_, transform) in fields.items():
+                value = mapping[f"{rel}__{name}"]
+                nested[name] = transform(value) if transform is not None and value is not None else value
+            item[rel] = nested
+
+
+def user_subscription_criteria(q, status, is_deleted, start_from, start_to, active_at) -> list:
+    criteria = []
     if q:
         pattern = f"%{q}%"
-        subs = base.filter(UserSubscription.payment_method.ilike(pattern)).all()
-    else:
-        subs = base.all()
-    result = []
-    for s in subs:
-        result.append({
-            "id": s.id,
-            "user_id": s.user_id,
-            "subscription_id": s.subscription_id,
-            "start_datetime": s.start_datetime,
-            "end_date": s.end_date,
-            "payment_method": s.payment_method,
-            "is_deleted": s.is_deleted,
-            "subscription_status": s.subscription_status,
-            "added_by": s.added_by,
-            "created_at": s.created_at,
-            "updated_at": s.updated_at,
-        })
-    return result
+        criteria.append(UserSubscription.payment_method.ilike(pattern))
+    if status:
+        criteria.append(UserSubscription.subscription_status == status)
+    if is_deleted is not None:
+        criteria.append(UserSubscription.is_deleted == is_deleted)
+    if start_from:
+        criteria.append(UserSubscription.start_datetime >= start_from)
+    if start_to:
+        criteria.append(UserSubscription.start_datetime < start_to)
+    if active_at:
+        # in force at that instant: started and not yet ended
+        criteria.append(UserSubscription.start_datetime <= active_at)
+        criteria.append(UserSubscription.end_date > active_at)
+    return criteria
+
+
+@router.get("/user-subscriptions")
+async def list_user_subscriptions(
+    request: Request,
+    response: Response,
+    q: str | None = None,
+    status: str | None = None,
+    is_deleted: bool | None = None,
+    start_from: datetime | None = None,
+    start_to: datetime | None = None,
+    active_at: datetime | None = None,
+    expand: str | None = None,
+    limit: int | None = Query(None, ge=1, le=settings.PAGE_MAX_LIMIT),
+    after: str | None = None,
+    include_total: bool = False,
+    fields: str | None = None,
+    db=Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    names = parse_fields(fields, USER_SUBSCRIPTION_FIELDS)
+    expansions = _parse_expand(expand)
+    stmt = _user_subscription_select(names, expansions).where(
+        *user_subscription_criteria(q, status, is_deleted, start_from, start_to, active_at)
+    )
+    total = (await fetch_first(db, count_statement(stmt)))[0] if include_total else None
+    rows = await fetch_all(db, keyset(stmt, UserSubscription.id, limit, after))
+    result, next_cursor = build_page(rows, USER_SUBSCRIPTION_FIELDS, names, limit)
+    _embed_expansions(rows, result, expansions)
+    set_page_headers(request, response, next_cursor, total)
+    return json_response(result, response)
 
 
 @router.get("/user-subscriptions/{sub_id}")
-def get_user_subscription(sub_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    s = db.query(UserSubscription).filter(UserSubscription.id == sub_id).first()
-    if not s:
+async def get_user_subscription(sub_id: int, expand: str | None = None, db=Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    names = list(USER_SUBSCRIPTION_FIELDS)
+    expansions = _parse_expand(expand)
+    row = await fetch_first(db, _user_subscription_select(names, expansions).where(UserSubscription.id == sub_id))
+    if not row:
         raise HTTPException(status_code=404, detail="User subscription not found")
-    return {
-        "id": s.id,
-        "user_id": s.user_id,
-        "subscription_id": s.subscription_id,
-        "start_datetime": s.start_datetime,
-        "end_date": s.end_date,
-        "payment_method": s.payment_method,
-        "is_deleted": s.is_deleted,
-        "subscription_status": s.subscription_status,
-        "added_by": s.added_by,
-        "created_at": s.created_at,
-        "updated_at": s.updated_at,
-    }
+    result, _ = build_page([row], USER_SUBSCRIPTION_FIELDS, names, None)
+    _embed_expansions([row], result, expansions)
+    return result[0]
 
 
 @router.post("/user-subscriptions")
@@ -235,8 +434,10 @@ def create_user_subscription(payload: UserSubscriptionCreateSchema, db: Session
         added_by=current_user.user_id,
     )
     db.add(new)
+    stats.subscriptions_changed(db, added=[stats.subscription_state(new)])
     db.commit()
     db.refresh(new)
+    invalidate_entitlement(new.user_id)
     return {"id": new.id}
 
 
@@ -245,6 +446,8 @@ def update_user_subscription(sub_id: int, payload: UserSubscriptionUpdateSchema,
     s = db.query(UserSubscription).filter(UserSubscription.id == sub_id).first()
     if not s:
         raise HTTPException(status_code=404, detail="User subscription not found")
+    previous_user_id = s.user_id
+    before = stats.subscription_state(s)
     if payload.user_id is not None:
         s.user_id = payload.user_id
     if payload.subscription_id is not None:
@@ -259,8 +462,12 @@ def update_user_subscription(sub_id: int, payload: UserSubscriptionUpdateSchema,
         s.subscription_status = payload.subscription_status
     if payload.is_deleted is not None:
         s.is_deleted = payload.is_deleted
+    after = stats.subscription_state(s)
+    if after != before:
+        stats.subscriptions_changed(db, removed=[before], added=[after])
     db.commit()
     db.refresh(s)
+    invalidate_entitlement(previous_user_id, s.user_id)
     return {"id": s.id}
 
 
@@ -270,91 +477,116 @@ def delete_user_subscription(sub_id: int, db: Session = Depends(get_db), current
     if not s:
         raise HTTPException(status_code=404, detail="User subscription not found")
     # soft delete
+    stats.subscriptions_changed(db, removed=[stats.subscription_state(s)])
     s.is_deleted = True
     db.commit()
+    invalidate_entitlement(s.user_id)
     return {"detail": "User subscription marked deleted"}
 
 
 # Media CRUD for subscriber uploads
 @router.get("/media")
-def list_media(user_id: int, date: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def list_media(user_id: int, date: str, cond: Conditional = Depends(), db=Depends(get_read_db), current_user: User = Depends(get_current_user)):
     # date expected as YYYY-MM-DD
     try:
         dt = datetime.fromisoformat(date).date()
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
-    medias = db.query(Media).filter(Media.user_id == user_id, Media.upload_date == dt, Media.is_deleted == False).all()
+    criteria = (Media.user_id == user_id, Media.upload_date == dt, Media.is_deleted == False)
+    last_updated, count = await collection_fingerprint(db, Media, *criteria)
+    expires = signing.expiry_bucket()
+    not_modified = cond.evaluate(make_etag("media", user_id, dt, last_updated, count, expires))
+    if not_modified:
+        return not_modified
+    medias = await fetch_all(db, select(
+        Media.id, Media.original_name, Media.stored_path, Media.blob_hash, Media.media_type, Media.created_at,
+    ).where(*criteria))
+    variants = await derivatives.load_variants(db, (m.blob_hash for m in medias))
     result = []
     for m in medias:
-        # construct public URL under /uploads
-        rel = Path(m.stored_path)
-        url = f"/uploads/{rel.as_posix()}"
         result.append({
             "id": m.id,
             "original_name": m.original_name,
-            "url": url,
+            "url": signing.media_url(m.stored_path, expires),
             "media_type": m.media_type,
             "created_at": m.created_at,
+            **derivatives.image_fields(variants.get(m.blob_hash), expires),
         })
-    return result
+    return json_response(result, cond.response)
 
 
-def _ensure_upload_dir(path: Path):
-    if not path.exists():
-        path.mkdir(parents=True, exist_ok=True)
+# Advertisements CRUD (image uploads only)
+def _advertisement_url(stored_path: str) -> str:
+    return signing.media_url(stored_path)
+
+
+ADVERTISEMENT_FIELDS = {
+    "id": (Advertisement.id, None),
+    "original_name": (Advertisement.original_name, None),
+    "url": (Advertisement.stored_path, _advertisement_url),
+    "created_at": (Advertisement.created_at, None),
+}
 
 
-# Advertisements CRUD (image uploads only)
 @router.get("/advertisements")
-def list_advertisements(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    ads = db.query(Advertisement).filter(Advertisement.is_deleted == False).all()
-    result = []
-    for a in ads:
-        rel = Path(a.stored_path)
-        url = f"/uploads/advertisements/{rel.name}"
-        result.append({
-            "id": a.id,
-            "original_name": a.original_name,
-            "url": url,
-            "created_at": a.created_at,
-        })
-    return result
+async def list_advertisements(request: Request, response: Response, limit: int | None = Query(None, ge=1, le=settings.PAGE_MAX_LIMIT), after: str | None = None, include_total: bool = False, fields: str | None = None, cond: Conditional = Depends(), db=Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    names = parse_fields(fields, ADVERTISEMENT_FIELDS)
+    last_updated, count = await collection_fingerprint(db, Advertisement, Advertisement.is_deleted == False)
+    not_modified = cond.evaluate(make_etag("advertisements", request.url.query, last_updated, count, signing.expiry_bucket()))
+    if not_modified:
+        return not_modified
+    stmt = select(*projection(ADVERTISEMENT_FIELDS, names, Advertisement.id)).where(Advertisement.is_deleted == False)
+    total = (await fetch_first(db, count_statement(stmt)))[0] if include_total else None
+    rows = await fetch_all(db, keyset(stmt, Advertisement.id, limit, after))
+    result, next_cursor = build_page(rows, ADVERTISEMENT_FIELDS, names, limit)
+    set_page_headers(request, response, next_cursor, total)
+    return json_response(result, response)
 
 
 @router.post("/advertisements")
-def upload_advertisement(files: TypingList[UploadFile] = File(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def upload_advertisement(background_tasks: BackgroundTasks, files: TypingList[UploadFile] = File(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # Only accept images
-    base_dir = Path.cwd() / "uploads" / "advertisements"
-    _ensure_upload_dir(base_dir)
-    created = []
-    for file in files:
-        ctype = (file.content_type or "").lower()
-        if not ctype.startswith("image"):
-            # skip non-image files (or you could raise)
-            continue
-        filename = file.filename
-        safe_name = filename.replace("..", "").replace("/", "_")
-        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
-        stored_name = f"{timestamp}_{safe_name}"
-        dest = base_dir / stored_name
-        with dest.open("wb") as f:
-            f.write(file.file.read())
-        rel_path = Path("advertisements") / stored_name
-        ad = Advertisement(original_name=filename, stored_path=str(rel_path.as_posix()), added_by=current_user.user_id)
-        db.add(ad)
+    budget = UploadBudget()
+    rows = []
+    staged = []
+    try:
+        for file in files:
+            ctype = (file.content_type or "").lower()
+            if not ctype.startswith("image"):
+                # skip non-image files (or you could raise)
+                continue
+            blob = blobs.stage_upload(file, budget)
+            staged.append(blob)
+            rows.append({"original_name": file.filename, "blob_hash": blob.sha256, "added_by": current_user.user_id})
+        # one multi-row INSERT ... RETURNING and a single commit for the whole batch
+        ids = []
+        if rows:
+            paths = blobs.add_refs(db, staged)
+            for row in rows:
+                row["stored_path"] = paths[row["blob_hash"]]
+            ids = db.execute(insert(Advertisement).returning(Advertisement.id, sort_by_parameter_order=True), rows).scalars().all()
         db.commit()
-        db.refresh(ad)
-        created.append({"id": ad.id, "original_name": ad.original_name, "url": f"/uploads/advertisements/{stored_name}"})
+    except BaseException:
+        blobs.discard(staged)
+        db.rollback()
+        raise
+    # thumbnails are rendered on the image worker pool after the response is sent
+    background_tasks.add_task(derivatives.generate, {row["blob_hash"]: row["stored_path"] for row in rows})
+    created = []
+    for ad_id, row in zip(ids, rows):
+        created.append({"id": ad_id, "original_name": row["original_name"], "url": signing.media_url(row["stored_path"])})
     return {"created": created}
 
 
 @router.get("/advertisements/{ad_id}")
-def get_advertisement(ad_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_advertisement(ad_id: int, cond: Conditional = Depends(), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     a = db.query(Advertisement).filter(Advertisement.id == ad_id, Advertisement.is_deleted == False).first()
     if not a:
         raise HTTPException(status_code=404, detail="Advertisement not found")
-    rel = Path(a.stored_path)
-    return {"id": a.id, "original_name": a.original_name, "url": f"/uploads/advertisements/{rel.name}", "created_at": a.created_at}
+    not_modified = cond.evaluate(make_etag("advertisement", a.id, a.updated_at, signing.expiry_bucket()))
+    if not_modified:
+        return not_modified
+    return {"id": a.id, "original_name": a.original_name, "url": _advertisement_url(a.stored_path), "created_at": a.created_at}
 
 
 @router.delete("/advertisements/{ad_id}")
@@ -362,61 +594,65 @@ def delete_advertisement(ad_id: int, db: Session = Depends(get_db), current_user
     a = db.query(Advertisement).filter(Advertisement.id == ad_id).first()
     if not a:
         raise HTTPException(status_code=404, detail="Advertisement not found")
-    # try to delete file
-    try:
-        file_path = Path.cwd() / "uploads" / Path(a.stored_path)
-        if file_path.exists():
-            file_path.unlink()
-    except Exception:
-        pass
+    if a.is_deleted:
+        return {"detail": "Advertisement deleted"}
+    # the file goes away with its last reference
+    pending = blobs.release(db, a)
     a.is_deleted = True
-    db.commit()
+    try:
+        db.commit()
+    except BaseException:
+        db.rollback()
+        pending.undo()
+        raise
     return {"detail": "Advertisement deleted"}
 
 
 @router.post("/media")
-def upload_media(files: TypingList[UploadFile] = File(...), user_id: int = Form(...), date: str = Form(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def upload_media(background_tasks: BackgroundTasks, files: TypingList[UploadFile] = File(...), user_id: int = Form(...), date: str = Form(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     try:
         dt = datetime.fromisoformat(date).date()
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
 
-    base_dir = Path.cwd() / "uploads" / f"subscriber_{user_id}" / date
-    _ensure_upload_dir(base_dir)
-    created = []
-    for upload in files:
-        filename = upload.filename
-        # sanitize filename
-        safe_name = filename.replace("..", "").replace("/", "_")
-        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
-        stored_name = f"{timestamp}_{safe_name}"
-        dest = base_dir / stored_name
-        with dest.open("wb") as f:
-            f.write(upload.file.read())
-        ctype = (upload.content_type or "").lower()
-        if ctype.startswith("image"):
-            mtype = "image"
-        elif ctype.startswith("video"):
-            mtype = "video"
-        else:
-            mtype = "file"
-        rel_path = Path(f"subscriber_{user_id}") / date / stored_name
-        media = Media(
-            user_id=user_id,
-            original_name=filename,
-            stored_path=str(rel_path.as_posix()),
-            media_type=mtype,
-            upload_date=dt,
-            added_by=current_user.user_id,
-        )
-        db.add(media)
+    budget = UploadBudget()
+    rows = []
+    staged = []
+    try:
+        for upload in files:
+            # identical files sent to many subscribers share one stored blob
+            blob = blobs.stage_upload(upload, budget)
+            staged.append(blob)
+            rows.append({
+                "user_id": user_id,
+                "original_name": upload.filename,
+                "blob_hash": blob.sha256,
+                "media_type": media_type_for(upload.content_type),
+                "upload_date": dt,
+                "added_by": current_user.user_id,
+            })
+        # one multi-row INSERT ... RETURNING and a single commit for the whole batch
+        ids = []
+        if rows:
+            paths = blobs.add_refs(db, staged)
+            for row in rows:
+                row["stored_path"] = paths[row["blob_hash"]]
+            ids = db.execute(insert(Media).returning(Media.id, sort_by_parameter_order=True), rows).scalars().all()
+            stats.media_added(db, [(row["user_id"], row["upload_date"], row["blob_hash"]) for row in rows])
         db.commit()
-        db.refresh(media)
+    except BaseException:
+        blobs.discard(staged)
+        db.rollback()
+        raise
+    # thumbnails are rendered on the image worker pool after the response is sent
+    background_tasks.add_task(derivatives.generate, {row["blob_hash"]: row["stored_path"] for row in rows if row["media_type"] == "image"})
+    created = []
+    for media_id, row in zip(ids, rows):
         created.append({
-            "id": media.id,
-            "original_name": media.original_name,
-            "url": f"/uploads/{rel_path.as_posix()}",
-            "media_type": media.media_type,
+            "id": media_id,
+            "original_name": row["original_name"],
+            "url": signing.media_url(row["stored_path"]),
+            "media_type": row["media_type"],
         })
     return {"created": created}
 
@@ -426,19 +662,21 @@ def delete_media(media_id: int, db: Session = Depends(get_db), current_user: Use
     m = db.query(Media).filter(Media.id == media_id).first()
     if not m:
         raise HTTPException(status_code=404, detail="Media not found")
-    # delete file if exists
-    try:
-        file_path = Path.cwd() / "uploads" / Path(m.stored_path)
-        if file_path.exists():
-            file_path.unlink()
-    except Exception:
-        pass
+    if m.is_deleted:
+        return {"detail": "Media deleted"}
+    stats.media_removed(db, [(m.user_id, m.upload_date, m.blob_hash)])
+    # the file goes away with its last reference
+    pending = blobs.release(db, m)
     m.is_deleted = True
-    db.commit()
+    try:
+        db.commit()
+    except BaseException:
+        db.rollback()
+        pending.undo()
+        raise
     return {"detail": "Media deleted"}
 
 
-
 # Subscriptions CRUD
 class SubscriptionCreateSchema(BaseModel):
     subscription_name: str
@@ -446,6 +684,7 @@ class SubscriptionCreateSchema(BaseModel):
     price: float
     duration: int
     active: bool | None = True
+    retention_days: int | None = None
 
 
 class SubscriptionUpdateSchema(BaseModel):
@@ -454,62 +693,84 @@ class SubscriptionUpdateSchema(BaseModel):
     price: float | None = None
     duration: int | None = None
     active: bool | None = None
+    # send null explicitly to keep media forever
+    retention_days: int | None = None
+
+
+SUBSCRIPTION_FIELDS = {
+    "id": (MasterSubscription.id, None),
+    "subscription_name": (MasterSubscription.subscription_name, None),
+    "description": (MasterSubscription.description, None),
+    "price": (MasterSubscription.price, float),
+    "duration": (MasterSubscription.duration, None),
+    "active": (MasterSubscription.active, None),
+    "retention_days": (MasterSubscription.retention_days, None),
+    "created_at": (MasterSubscription.created_at, None),
+    "updated_at": (MasterSubscription.updated_at, None),
+}
 
 
 @router.get("/subscriptions")
-def list_subscriptions(q: str | None = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def list_subscriptions(request: Request, response: Response, q: str | None = None, limit: int | None = Query(None, ge=1, le=settings.PAGE_MAX_LIMIT), after: str | None = None, include_total: bool = False, fields: str | None = None, cond: Conditional = Depends(), current_user: User = Depends(get_current_user)):
+    # Served from the in-process catalog cache; the plain listing is returned
+    # as pre-serialized bytes.
+    catalog = await get_catalog()
+    not_modified = cond.evaluate(make_etag("subscriptions", catalog.version, request.url.query))
+    if not_modified:
+        return not_modified
+    if not (q or limit or after or include_total or fields):
+        return Response(content=catalog.list_bytes, media_type="application/json", headers=cond.headers)
+    names = parse_fields(fields, SUBSCRIPTION_FIELDS)
+    items = catalog.items
     # list subscriptions, optional search by name
-    base = db.query(MasterSubscription)
     if q:
-        pattern = f"%{q}%"
-        subs = base.filter(MasterSubscription.subscription_name.ilike(pattern)).all()
-    else:
-        subs = base.all()
-    result = []
-    for s in subs:
-        result.append({
-            "id": s.id,
-            "subscription_name": s.subscription_name,
-            "description": s.description,
-            "price": float(s.price),
-            "duration": s.duration,
-            "active": s.active,
-            "created_at": s.created_at,
-            "updated_at": s.updated_at,
-        })
-    return result
+        needle = q.lower()
+        items = [s for s in items if needle in s["subscription_name"].lower()]
+    total = len(items) if include_total else None
+    if after:
+        (last_id,) = decode_cursor(after)
+        if not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        items = [s for s in items if s["id"] > last_id]
+    next_cursor = None
+    if limit and len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]["id"])
+    set_page_headers(request, response, next_cursor, total)
+    return json_response([{name: s[name] for name in names} for s in items], response)
 
 
 @router.get("/subscriptions/{sub_id}")
-def get_subscription(sub_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    s = db.query(MasterSubscription).filter(MasterSubscription.id == sub_id).first()
-    if not s:
+async def get_subscription(sub_id: int, cond: Conditional = Depends(), current_user: User = Depends(get_current_user)):
+    catalog = await get_catalog()
+    body = catalog.item_bytes.get(sub_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Subscription not found")
-    return {
-        "id": s.id,
-        "subscription_name": s.subscription_name,
-        "description": s.description,
-        "price": float(s.price),
-        "duration": s.duration,
-        "active": s.active,
-        "created_at": s.created_at,
-        "updated_at": s.updated_at,
-    }
+    updated_at = catalog.by_id[sub_id]["updated_at"]
+    not_modified = cond.evaluate(make_etag("subscription", sub_id, updated_at, catalog.version), last_modified=updated_at)
+    if not_modified:
+        return not_modified
+    return Response(content=body, media_type="application/json", headers=cond.headers)
 
 
 @router.post("/subscriptions")
 def create_subscription(payload: SubscriptionCreateSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if payload.retention_days is not None and payload.retention_days < 1:
+        raise HTTPException(status_code=400, detail="retention_days must be at least 1")
     new = MasterSubscription(
         subscription_name=payload.subscription_name,
         description=payload.description,
         price=payload.price,
         duration=payload.duration,
         active=payload.active if payload.active is not None else True,
+        retention_days=payload.retention_days,
     )
     db.add(new)
+    bump_version(db, CATALOG_VERSION_KEY)
     db.commit()
+    subscription_catalog.invalidate()
     db.refresh(new)
-    return {"id": new.id, "subscription_name": new.subscription_name, "price": float(new.price), "duration": new.duration, "active": new.active}
+    return {"id": new.id, "subscription_name": new.subscription_name, "price": float(new.price), "duration": new.duration, "active": new.active, "retention_days": new.retention_days}
 
 
 @router.put("/subscriptions/{sub_id}")
@@ -517,6 +778,8 @@ def update_subscription(sub_id: int, payload: SubscriptionUpdateSchema, db: Sess
     s = db.query(MasterSubscription).filter(MasterSubscription.id == sub_id).first()
     if not s:
         raise HTTPException(status_code=404, detail="Subscription not found")
+    if payload.retention_days is not None and payload.retention_days < 1:
+        raise HTTPException(status_code=400, detail="retention_days must be at least 1")
     if payload.subscription_name is not None:
         s.subscription_name = payload.subscription_name
     if payload.description is not None:
@@ -527,9 +790,13 @@ def update_subscription(sub_id: int, payload: SubscriptionUpdateSchema, db: Sess
         s.duration = payload.duration
     if payload.active is not None:
         s.active = payload.active
+    if "retention_days" in payload.model_fields_set:
+        s.retention_days = payload.retention_days
+    bump_version(db, CATALOG_VERSION_KEY)
     db.commit()
+    subscription_catalog.invalidate()
     db.refresh(s)
-    return {"id": s.id, "subscription_name": s.subscription_name, "price": float(s.price), "duration": s.duration, "active": s.active}
+    return {"id": s.id, "subscription_name": s.subscription_name, "price": float(s.price), "duration": s.duration, "active": s.active, "retention_days": s.retention_days}
 
 
 @router.delete("/subscriptions/{sub_id}")
@@ -538,5 +805,7 @@ def delete_subscription(sub_id: int, db: Session = Depends(get_db), current_user
     if not s:
         raise HTTPException(status_code=404, detail="Subscription not found")
     db.delete(s)
+    bump_version(db, CATALOG_VERSION_KEY)
     db.commit()
+    subscription_catalog.invalidate()
     return {"detail": "Subscription deleted"}
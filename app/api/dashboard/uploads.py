@@ -0,0 +1,193 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from pydantic import BaseModel
+import math
+import uuid
+
+from app.api.dashboard.router import get_current_user
+from app.models import get_db
+from app.config.config import settings
+from app.models.user import User
+from app.models.media import Media
+from app.models.upload_session import UploadSession
+from app.services import upload_sessions
+from app.services import blobs, derivatives, signing, stats
+from app.services.storage import media_type_for
+
+router = APIRouter()
+
+
+class UploadSessionCreateSchema(BaseModel):
+    user_id: int
+    date: str  # YYYY-MM-DD
+    file_name: str
+    content_type: str | None = None
+    total_size: int
+    chunk_size: int | None = None
+    sha256: str | None = None
+
+
+def _session_info(s: UploadSession, received: list[int] | None = None):
+    info = {
+        "upload_id": s.id,
+        "user_id": s.user_id,
+        "date": s.upload_date.isoformat(),
+        "file_name": s.original_name,
+        "total_size": s.total_size,
+        "chunk_size": s.chunk_size,
+        "total_chunks": s.total_chunks,
+        "status": s.status,
+        "media_id": s.media_id,
+        "expires_at": s.expires_at,
+    }
+    if received is not None:
+        received_set = set(received)
+        info["received"] = received
+        info["missing"] = [i for i in range(s.total_chunks) if i not in received_set]
+    return info
+
+
+def _get_open_session(db: Session, upload_id: str, for_update: bool = False) -> UploadSession:
+    query = db.query(UploadSession).filter(UploadSession.id == upload_id)
+    if for_update:
+        query = query.with_for_update()
+    s = query.first()
+    if not s or (s.status != "completed" and s.expires_at < datetime.utcnow()):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return s
+
+
+@router.post("/uploads")
+def create_upload_session(payload: UploadSessionCreateSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    try:
+        dt = datetime.fromisoformat(payload.date).date()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+    if payload.total_size <= 0:
+        raise HTTPException(status_code=400, detail="total_size must be positive")
+    if payload.total_size > settings.UPLOAD_MAX_FILE_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds the {settings.UPLOAD_MAX_FILE_BYTES} byte limit")
+    chunk_size = payload.chunk_size or settings.UPLOAD_SESSION_CHUNK_SIZE
+    if chunk_size <= 0 or chunk_size > settings.UPLOAD_SESSION_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail=f"chunk_size must be between 1 and {settings.UPLOAD_SESSION_MAX_CHUNK_SIZE}")
+    s = UploadSession(
+        id=str(uuid.uuid4()),
+        user_id=payload.user_id,
+        upload_date=dt,
+        original_name=payload.file_name,
+        content_type=payload.content_type,
+        total_size=payload.total_size,
+        chunk_size=chunk_size,
+        total_chunks=math.ceil(payload.total_size / chunk_size),
+        sha256=payload.sha256.lower() if payload.sha256 else None,
+        status="open",
+        created_by=current_user.user_id,
+        expires_at=upload_sessions.new_expiry(),
+    )
+    db.add(s)
+    db.commit()
+    db.refresh(s)
+    return _session_info(s, received=[])
+
+
+@router.get("/uploads/{upload_id}")
+def get_upload_session(upload_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    s = _get_open_session(db, upload_id)
+    received = upload_sessions.received_chunks(s) if s.status != "completed" else list(range(s.total_chunks))
+    return _session_info(s, received=received)
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Chunks are written straight to their own part file without locking the
+    # session row, so clients can send them in parallel and retry them freely.
+    s = await run_in_threadpool(_get_open_session, db, upload_id)
+    if s.status == "completed":
+        raise HTTPException(status_code=409, detail="Upload session already completed")
+    if index < 0 or index >= s.total_chunks:
+        raise HTTPException(status_code=400, detail="Chunk index out of range")
+    expected = upload_sessions.expected_chunk_size(s, index)
+    # Stream to disk, holding at most UPLOAD_CHUNK_SIZE bytes in memory
+    writer = await run_in_threadpool(upload_sessions.ChunkWriter, s, index)
+    buffer = bytearray()
+    size = 0
+    try:
+        async for piece in request.stream():
+            size += len(piece)
+            if size > expected:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Chunk {index} must be {expected} bytes")
+            buffer += piece
+            if len(buffer) >= settings.UPLOAD_CHUNK_SIZE:
+                await run_in_threadpool(writer.write, bytes(buffer))
+                buffer.clear()
+        if size != expected:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes, got {size}")
+        await run_in_threadpool(writer.write, bytes(buffer))
+        await run_in_threadpool(writer.commit)
+    except BaseException:
+        writer.discard()
+        raise
+    await run_in_threadpool(upload_sessions.refresh_expiry, db, s)
+    return {"upload_id": s.id, "index": index, "size": size}
+
+
+@router.post("/uploads/{upload_id}/complete")
+def complete_upload_session(upload_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Lock the session row so concurrent finalize calls create a single Media row
+    s = _get_open_session(db, upload_id, for_update=True)
+    if s.status == "completed":
+        media = db.query(Media).filter(Media.id == s.media_id).first()
+    else:
+        received = upload_sessions.received_chunks(s)
+        if len(received) != s.total_chunks:
+            raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "missing": _session_info(s, received)["missing"]})
+        staged = upload_sessions.assemble(s)
+        if s.sha256 and staged.sha256 != s.sha256:
+            blobs.discard([staged])
+            raise HTTPException(status_code=422, detail="Checksum mismatch, upload the chunks again")
+        try:
+            paths = blobs.add_refs(db, [staged])
+            media = Media(
+                user_id=s.user_id,
+                original_name=s.original_name,
+                stored_path=paths[staged.sha256],
+                blob_hash=staged.sha256,
+                media_type=media_type_for(s.content_type),
+                upload_date=s.upload_date,
+                added_by=current_user.user_id,
+            )
+            db.add(media)
+            db.flush()
+            stats.media_added(db, [(media.user_id, media.upload_date, media.blob_hash)])
+            s.media_id = media.id
+            s.status = "completed"
+            # kept this long for retried complete calls, then purged
+            s.expires_at = upload_sessions.new_expiry()
+            db.commit()
+        except Exception:
+            blobs.discard([staged])
+            db.rollback()
+            raise
+        db.refresh(media)
+        upload_sessions.remove_session_files(s.id)
+        if media.media_type == "image":
+            background_tasks.add_task(derivatives.generate, {media.blob_hash: media.stored_path})
+    return {
+        "id": media.id,
+        "original_name": media.original_name,
+        "url": signing.media_url(media.stored_path),
+        "media_type": media.media_type,
+    }
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_upload_session(upload_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    s = _get_open_session(db, upload_id)
+    if s.status == "completed":
+        raise HTTPException(status_code=409, detail="Upload session already completed")
+    upload_sessions.remove_session_files(s.id)
+    db.delete(s)
+    db.commit()
+    return {"detail": "Upload session aborted"}
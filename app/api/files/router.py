@@ -0,0 +1,94 @@
+import os
+import re
+import stat
+import time
+from datetime import datetime, timezone
+from mimetypes import guess_type
+from pathlib import Path, PurePosixPath
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import FileResponse
+
+from app.config.config import settings
+from app.services import archive, signing
+from app.services.http_cache import Conditional
+from app.services.storage import upload_root
+
+router = APIRouter()
+
+# blobs/ab/cd/<sha256>.ext: the name is the content hash
+_BLOB_RE = re.compile(r"^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+# blobs/variants/ab/cd/<sha256>_<variant>.ext and legacy <20 digit timestamp>_<name> uploads
+_IMMUTABLE_NAME_RE = re.compile(r"^(blobs/variants/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}_\w+\.\w+|.*/\d{20}_[^/]+)$")
+
+
+class MediaFileResponse(FileResponse):
+    # larger reads than the 64 KiB default keep long video ranges cheap
+    chunk_size = settings.MEDIA_READ_CHUNK_SIZE
+
+
+def _resolve(path: str) -> tuple[str, Path]:
+    rel = PurePosixPath(path)
+    # hidden entries hold staging and trash files (blobs/.incoming, blobs/.trash)
+    if rel.is_absolute() or any(part in ("", ".", "..") or part.startswith(".") for part in rel.parts):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return rel.as_posix(), upload_root() / rel
+
+
+def _validators(rel: str, st: os.stat_result, expires: int | None) -> tuple[str, str]:
+    """Strong ETag and Cache-Control for a stored file.
+
+    A response to a signed URL is private and may not be cached past the
+    URL's expiry.
+    """
+    blob = _BLOB_RE.match(rel)
+    etag = f'"{blob.group("sha256")}"' if blob else f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    immutable = bool(blob or _IMMUTABLE_NAME_RE.match(rel))
+    max_age = settings.MEDIA_IMMUTABLE_MAX_AGE if immutable else settings.MEDIA_CACHE_MAX_AGE
+    scope = "public"
+    if expires is not None:
+        scope = "private"
+        max_age = max(0, min(max_age, expires - int(time.time())))
+    return etag, f"{scope}, max-age={max_age}" + (", immutable" if immutable else "")
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+def serve_file(path: str, exp: str | None = None, kid: str | None = None, sig: str | None = None, cond: Conditional = Depends()):
+    """
+    Serve an uploaded file.
+    Requires a signed URL (exp, kid, sig query params, as returned by the list
+    endpoints) unless MEDIA_REQUIRE_SIGNED_URLS is off. The signature is
+    checked in memory, without touching the database. Archived originals are
+    restored to the hot tier on first request.
+    Supports Range requests (206), If-None-Match / If-Modified-Since (304)
+    and, with MEDIA_ACCEL_REDIRECT_PREFIX set, hands the transfer to nginx.
+    """
+    rel, full_path = _resolve(path)
+    expires = signing.verify(rel, exp, kid, sig)
+    if expires is None and settings.MEDIA_REQUIRE_SIGNED_URLS:
+        raise HTTPException(status_code=403, detail="Invalid or expired media URL")
+    try:
+        st = full_path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        # only a miss reaches the database: the original may be on the archive tier
+        blob = _BLOB_RE.match(rel)
+        if not blob or not archive.restore_blob(blob.group("sha256")):
+            raise HTTPException(status_code=404, detail="Not Found")
+        st = full_path.stat()
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    etag, cache_control = _validators(rel, st, expires)
+    last_modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+    not_modified = cond.evaluate(etag, last_modified=last_modified, cache_control=cache_control)
+    if not_modified:
+        return not_modified
+
+    media_type = guess_type(full_path.name)[0] or "application/octet-stream"
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the bytes (with sendfile and Range) from its internal location
+        headers = {**cond.headers, "X-Accel-Redirect": settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + rel}
+        return Response(headers=headers, media_type=media_type)
+    # Range/If-Range handling comes from FileResponse; servers that offer the
+    # ASGI pathsend extension send the file without copying it through Python
+    return MediaFileResponse(full_path, headers=cond.headers, media_type=media_type, stat_result=st)
@@ -1,11 +1,10 @@
-
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.models import SessionLocal
+from starlette.concurrency import run_in_threadpool
+from app.models import get_db
 from app.models.user import User
-import bcrypt
-import jwt
-import os
+from app.services import passwords
+from app.services.tokens import create_access_token, revoke_tokens
 from pydantic import BaseModel, EmailStr
 
 
@@ -15,9 +14,6 @@ class LoginRequest(BaseModel):
 
 router = APIRouter()
 
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
-ALGORITHM = "HS256"
-
 
 class UserCreate(BaseModel):
     user_name: str
@@ -25,48 +21,26 @@ class UserCreate(BaseModel):
     role: str
     password: str
 
-def verify_password(plain_password, hashed_password):
-    # Truncate plain password to 72 bytes to match bcrypt limit
-    pw_bytes = plain_password.encode("utf-8")[:72]
-    try:
-        return bcrypt.checkpw(pw_bytes, hashed_password.encode("utf-8"))
-    except Exception:
-        return False
-
-def get_password_hash(password):
-    pw_bytes = password.encode("utf-8")[:72]
-    hashed = bcrypt.hashpw(pw_bytes, bcrypt.gensalt())
-    return hashed.decode("utf-8")
-
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.user_name == username).first()
-    if not user or not verify_password(password, user.password):
-        return None
-    return user
-
-def create_access_token(data: dict):
-    return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
-
 # Registration endpoint removed from mobile API. Use dashboard `/add-user` for registration.
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _find_by_name(db: Session, user_name: str):
+    return db.query(User).filter(User.user_name == user_name).first()
 
 
 @router.post("/login")
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    # Use the authenticate_user helper to verify password
-    user = db.query(User).filter(User.user_name == payload.user_name).first()
+async def login(payload: LoginRequest, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_find_by_name, db, payload.user_name)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(payload.password, user.password):
+    if not await passwords.verify_password(payload.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token({"user_id": str(user.user_id), "role": user.role})
+    if passwords.needs_rehash(user.password):
+        user.password = await passwords.hash_password(payload.password)
+    # A new login supersedes every token issued before it
+    await run_in_threadpool(revoke_tokens, db, user)
+    token = create_access_token(user)
+    user_id = user.user_id
     user.auth_token = token
-    db.commit()
-    return {"token": token, "user_id": str(user.user_id)}
+    await run_in_threadpool(db.commit)
+    return {"token": token, "user_id": str(user_id)}
@@ -1,11 +1,32 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
-from app.models import SessionLocal
+from app.config.config import settings
+from app.models import get_db
+from app.models.async_session import fetch_all, fetch_first, get_read_db
 from app.models.media import Media
-from pathlib import Path
-from datetime import datetime
+from app.services import derivatives, signing, subscriptions
+from app.services.http_cache import Conditional, collection_fingerprint, make_etag
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.responses import json_response
+from app.services.tokens import CachedUser, decode_access_token, get_token_user
+from datetime import datetime, timedelta
 
 router = APIRouter()
+security = HTTPBearer()
+
+
+def get_current_subscriber(user_id: int, credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> CachedUser:
+    # A subscriber may only read their own media and entitlement: the
+    # responses carry signed file URLs, which are as good as the files.
+    claims = decode_access_token(credentials.credentials)
+    user = get_token_user(db, claims)
+    if not user or not user.active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+    if user.role != "subscriber" or user.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed for this user")
+    return user
 
 
 @router.get("/ping")
@@ -13,36 +34,115 @@ def ping():
     return {"message": "Mobile API is working"}
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@router.get("/entitlement")
+async def get_entitlement(user_id: int, db=Depends(get_read_db), current_user: CachedUser = Depends(get_current_subscriber)):
+    """
+    Does the user have a subscription in force right now?
+    Query params: user_id (int); requires the subscriber's own bearer token
+    Returns {"user_id", "active", "subscription_ids", "expires_at"}; expires_at
+    is the latest end_date among the subscriptions currently in force.
+    Served from a short-lived per-user cache; dashboard changes to the user's
+    subscriptions clear it.
+    """
+    periods = await subscriptions.load_periods(db, user_id)
+    return {"user_id": user_id, **subscriptions.entitlement(periods)}
 
 
 @router.get("/media")
-def list_media(user_id: int, date: str, db: Session = Depends(get_db)):
+async def list_media(user_id: int, date: str, cond: Conditional = Depends(), db=Depends(get_read_db), current_user: CachedUser = Depends(get_current_subscriber)):
     """
     Mobile-friendly media list endpoint.
-    Query params: user_id (int), date (YYYY-MM-DD)
-    Returns list of media items with fields: id, original_name, url, media_type, created_at
+    Query params: user_id (int), date (YYYY-MM-DD); requires the subscriber's own bearer token
+    Returns list of media items with fields: id, original_name, url, media_type, created_at,
+    thumbnail_url, srcset, variants (null/empty until the image variants are rendered)
     """
     try:
         dt = datetime.fromisoformat(date).date()
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
 
-    medias = db.query(Media).filter(Media.user_id == user_id, Media.upload_date == dt, Media.is_deleted == False).all()
+    criteria = (Media.user_id == user_id, Media.upload_date == dt, Media.is_deleted == False)
+    # Phones poll this all day: answer 304 from an aggregate before loading rows
+    last_updated, count = await collection_fingerprint(db, Media, *criteria)
+    # signed URLs in the body change with the expiry bucket, so it is part of the ETag
+    expires = signing.expiry_bucket()
+    not_modified = cond.evaluate(make_etag("mobile-media", user_id, dt, last_updated, count, expires))
+    if not_modified:
+        return not_modified
+    medias = await fetch_all(db, select(
+        Media.id, Media.original_name, Media.stored_path, Media.blob_hash, Media.media_type, Media.created_at,
+    ).where(*criteria))
+    variants = await derivatives.load_variants(db, (m.blob_hash for m in medias))
     result = []
     for m in medias:
-        rel = Path(m.stored_path)
-        url = f"/uploads/{rel.as_posix()}"
         result.append({
             "id": m.id,
             "original_name": m.original_name,
-            "url": url,
+            "url": signing.media_url(m.stored_path, expires),
+            "media_type": m.media_type,
+            "created_at": m.created_at,
+            **derivatives.image_fields(variants.get(m.blob_hash), expires),
+        })
+    return json_response(result, cond.response)
+
+
+def _parse_sync_cursor(since: str):
+    updated_at, media_id = decode_cursor(since, 2)
+    try:
+        updated_at = datetime.fromisoformat(updated_at)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(media_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return updated_at, media_id
+
+
+@router.get("/media/changes")
+async def media_changes(user_id: int, since: str | None = None, limit: int = Query(settings.SYNC_PAGE_SIZE, ge=1, le=settings.PAGE_MAX_LIMIT), db=Depends(get_read_db), current_user: CachedUser = Depends(get_current_subscriber)):
+    """
+    Incremental sync of a user's media across all dates.
+    Query params: user_id (int), since (cursor from the previous response), limit;
+    requires the subscriber's own bearer token
+    Returns {"changes": [...], "next_cursor": str | None, "has_more": bool}.
+    Changes are ordered by (updated_at, id); deleted media come back as
+    tombstones ({"id", "is_deleted": true, "updated_at"}). Without ``since``
+    the full live set is returned and tombstones are skipped.
+    Keep calling with next_cursor while has_more is true, then store it for
+    the next sync.
+    """
+    stmt = select(
+        Media.id, Media.original_name, Media.stored_path, Media.blob_hash, Media.media_type,
+        Media.upload_date, Media.is_deleted, Media.created_at, Media.updated_at,
+    ).where(Media.user_id == user_id)
+    if since:
+        stmt = stmt.where(tuple_(Media.updated_at, Media.id) > _parse_sync_cursor(since))
+    else:
+        stmt = stmt.where(Media.is_deleted == False)
+    if settings.SYNC_LAG_SECONDS > 0:
+        # use the database clock: updated_at is stamped by the server
+        (now,) = await fetch_first(db, select(func.now()))
+        stmt = stmt.where(Media.updated_at <= now - timedelta(seconds=settings.SYNC_LAG_SECONDS))
+    rows = await fetch_all(db, stmt.order_by(Media.updated_at, Media.id).limit(limit + 1))
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    variants = await derivatives.load_variants(db, (m.blob_hash for m in rows if not m.is_deleted))
+    changes = []
+    for m in rows:
+        if m.is_deleted:
+            changes.append({"id": m.id, "is_deleted": True, "updated_at": m.updated_at})
+            continue
+        changes.append({
+            "id": m.id,
+            "original_name": m.original_name,
+            "url": signing.media_url(m.stored_path),
             "media_type": m.media_type,
+            "upload_date": m.upload_date,
+            "is_deleted": False,
             "created_at": m.created_at,
+            "updated_at": m.updated_at,
+            **derivatives.image_fields(variants.get(m.blob_hash)),
         })
-    return result
+    # an empty page hands the caller's cursor back so it can poll again from the same spot
+    next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id) if rows else since
+    return json_response({"changes": changes, "next_cursor": next_cursor, "has_more": has_more})
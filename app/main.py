@@ -1,16 +1,50 @@
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.dashboard.router import router as dashboard_router
 from app.api.dashboard.auth import router as dashboard_auth_router
+from app.api.dashboard.uploads import router as dashboard_uploads_router
+from app.api.dashboard.exports import router as dashboard_exports_router
+from app.api.dashboard.imports import router as dashboard_imports_router
 from app.api.mobile.router import router as mobile_router
 from app.api.mobile.auth import router as mobile_auth_router
-import os
-from fastapi.staticfiles import StaticFiles
-from app.models import SessionLocal
-from app.config.config import init_db
+from app.api.files.router import router as files_router
+from app.config.config import init_db, settings
+from app.models.async_session import dispose_async_engine
+from app.services import archive, derivatives, file_gc, passwords, scheduler, stats, subscriptions, upload_sessions
+from app.services.pagination import PAGE_HEADERS
+from app.services.responses import FastJSONResponse
+from app.services.catalog import subscription_catalog
+from starlette.concurrency import run_in_threadpool
+import logging
 
-app = FastAPI(title="PBS Backend API")
+logger = logging.getLogger(__name__)
+
+scheduler.register_job("purge-upload-sessions", settings.UPLOAD_SESSION_GC_INTERVAL_SECONDS, upload_sessions.purge_expired_sessions)
+scheduler.register_job("process-file-deletions", settings.FILE_DELETION_INTERVAL_SECONDS, file_gc.process_deletions)
+scheduler.register_job("collect-orphan-files", settings.ORPHAN_GC_INTERVAL_SECONDS, file_gc.collect_orphans)
+scheduler.register_job("expire-subscriptions", settings.SUBSCRIPTION_EXPIRY_INTERVAL_SECONDS, subscriptions.expire_subscriptions)
+scheduler.register_job("reconcile-stats", settings.STATS_RECONCILE_INTERVAL_SECONDS, stats.reconcile_stats)
+scheduler.register_job("archive-expired-media", settings.ARCHIVE_INTERVAL_SECONDS, archive.archive_expired_media)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await run_in_threadpool(subscription_catalog.refresh)
+    except Exception:
+        # the catalog loads lazily on first use if the DB is not reachable yet
+        logger.exception("Could not preload the subscription catalog")
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    derivatives.shutdown()
+    passwords.shutdown()
+    await dispose_async_engine()
+
+
+app = FastAPI(title="PBS Backend API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,30 +52,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=PAGE_HEADERS + ["ETag", "Last-Modified", "Accept-Ranges", "Content-Range", "Content-Length"],
 )
 
 
-
 app.include_router(dashboard_router, prefix="/dashboard", tags=["Dashboard"])
 app.include_router(dashboard_auth_router, prefix="/dashboard", tags=["Dashboard Auth"])
+app.include_router(dashboard_uploads_router, prefix="/dashboard", tags=["Dashboard Uploads"])
+app.include_router(dashboard_exports_router, prefix="/dashboard", tags=["Dashboard Exports"])
+app.include_router(dashboard_imports_router, prefix="/dashboard", tags=["Dashboard Imports"])
 app.include_router(mobile_router, prefix="/mobile", tags=["Mobile"])
 app.include_router(mobile_auth_router, prefix="/mobile", tags=["Mobile Auth"])
 
 # Serve uploaded files from /uploads
-uploads_dir = "uploads"
-if not os.path.exists(uploads_dir):
-    os.makedirs(uploads_dir, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
-# Also mount uploads under /mobile/uploads to support mobile clients
+app.include_router(files_router, prefix="/uploads", tags=["Files"])
+# Also serve uploads under /mobile/uploads to support mobile clients
 # that use a BASE_API_URL including the /mobile prefix.
-app.mount("/mobile/uploads", StaticFiles(directory=uploads_dir), name="mobile-uploads")
+app.include_router(files_router, prefix="/mobile/uploads", tags=["Files"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @app.get("/")
 def read_root():
@@ -1,15 +1,27 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, Boolean
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, TIMESTAMP, Boolean, Index
+from sqlalchemy.sql import func, text
 from app.models import Base
 
 
 class Advertisement(Base):
     __tablename__ = "advertisements"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        Index(
+            "ix_advertisements_live", "id",
+            postgresql_where=text("is_deleted = false"), sqlite_where=text("is_deleted = false"),
+        ),
+        # blob refcount release, derivative bookkeeping and archiving look rows up by blob
+        Index("ix_advertisements_blob_hash", "blob_hash"),
+        # orphan file collector matches files by path
+        Index("ix_advertisements_stored_path", "stored_path"),
+        {"schema": "public"},
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     original_name = Column(String(255), nullable=False)
     stored_path = Column(String(1024), nullable=False)
+    # sha256 of the shared blob; NULL for uploads that predate the blob store
+    blob_hash = Column(String(64), nullable=True)
     added_by = Column(Integer, nullable=True)
-    is_deleted = Column(Boolean, nullable=False, server_default='false')
+    is_deleted = Column(Boolean, nullable=False, server_default=text('false'))
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,94 @@
+# Optional async database stack for the read-heavy endpoints.
+#
+# With ASYNC_DB_ENABLED the hot list endpoints run on an AsyncSession backed by
+# create_async_engine (asyncpg for Postgres, aiosqlite for SQLite); otherwise
+# they fall back to the regular sync Session, with queries run in the threadpool.
+import time
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config.config import settings
+from app.models import SessionLocal, pool_metrics
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def async_database_url(url: str) -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+", 1)[0]
+    if driver == "postgresql":
+        return f"postgresql+asyncpg{sep}{rest}"
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.startswith("postgresql+asyncpg"):
+        server_settings = {"application_name": settings.DB_APPLICATION_NAME}
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        options["connect_args"] = {"server_settings": server_settings}
+    return options
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        # Imported lazily so the sync-only deployment does not need the async drivers
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        url = async_database_url(settings.DATABASE_URL)
+        _async_engine = create_async_engine(url, **_engine_options(url))
+        _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_engine
+
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_sessionmaker = None
+
+
+async def get_read_db():
+    """Session for read-only endpoints: AsyncSession when enabled, sync Session otherwise."""
+    if settings.ASYNC_DB_ENABLED:
+        get_async_engine()
+        async with _async_sessionmaker() as session:
+            yield session
+        return
+    db = SessionLocal()
+    pool_metrics.session_opened()
+    start = time.perf_counter()
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
+        pool_metrics.session_closed(time.perf_counter() - start)
+
+
+async def fetch_all(db, stmt):
+    if isinstance(db, Session):
+        return await run_in_threadpool(lambda: db.execute(stmt).all())
+    return (await db.execute(stmt)).all()
+
+
+async def fetch_first(db, stmt):
+    if isinstance(db, Session):
+        return await run_in_threadpool(lambda: db.execute(stmt).first())
+    return (await db.execute(stmt)).first()
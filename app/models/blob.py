@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, BigInteger, String, TIMESTAMP, Index
+from sqlalchemy.sql import func
+from app.models import Base
+
+
+class Blob(Base):
+    """A stored file, kept once per distinct content and shared by every row that references it."""
+    __tablename__ = "blobs"
+    __table_args__ = (
+        # orphan file collector and the deletion worker match files by path
+        Index("ix_blobs_stored_path", "stored_path"),
+        {"schema": "public"},
+    )
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    # relative to UPLOADS_DIR, e.g. blobs/ab/cd/abcd...ef.jpg
+    stored_path = Column(String(1024), nullable=False)
+    ref_count = Column(Integer, nullable=False, server_default='0')
+    # zip batch under ARCHIVE_DIR holding a copy of the original
+    archive_path = Column(String(1024), nullable=True)
+    # set while the original lives only in the archive (removed from the hot tier)
+    archived_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, String, TIMESTAMP, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from app.models import Base
+
+
+class BlobVariant(Base):
+    """A resized copy of an image blob (thumbnail, medium) in one output format."""
+    __tablename__ = "blob_variants"
+    __table_args__ = (
+        UniqueConstraint("blob_hash", "variant", "format", name="uq_blob_variants_blob_variant_format"),
+        # orphan file collector matches files by path
+        Index("ix_blob_variants_stored_path", "stored_path"),
+        {"schema": "public"},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    blob_hash = Column(String(64), nullable=False)
+    variant = Column(String(20), nullable=False)
+    format = Column(String(10), nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    stored_path = Column(String(1024), nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, BigInteger, TIMESTAMP
+from sqlalchemy.sql import func
+from app.models import Base
+
+
+class CacheVersion(Base):
+    """Per-dataset change counters that workers poll to invalidate local caches."""
+    __tablename__ = "cache_versions"
+    __table_args__ = {"schema": "public"}
+    name = Column(String(100), primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default='0')
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, TIMESTAMP, Index
+from sqlalchemy.sql import func
+from app.models import Base
+
+
+class FileDeletion(Base):
+    """A file under UPLOADS_DIR waiting to be unlinked by the background worker."""
+    __tablename__ = "file_deletions"
+    __table_args__ = (
+        Index("ix_file_deletions_not_before", "not_before"),
+        # the orphan collector leaves queued trash to the worker
+        Index("ix_file_deletions_stored_path", "stored_path"),
+        {"schema": "public"},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    stored_path = Column(String(1024), nullable=False)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    last_error = Column(String(500), nullable=True)
+    # UTC; the worker skips the row until then (retry backoff)
+    not_before = Column(TIMESTAMP, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
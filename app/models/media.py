@@ -1,18 +1,40 @@
-from sqlalchemy import Column, Integer, String, Date, TIMESTAMP, Boolean
-from sqlalchemy.sql import func
-from app.models import Base
+from sqlalchemy import Column, Integer, String, Date, TIMESTAMP, Boolean, Index
+from sqlalchemy.sql import func, text
+from app.models import Base, trigram_index
 
 
 class Media(Base):
     __tablename__ = "media"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        # list_media: user_id + upload_date over live rows only
+        Index(
+            "ix_media_user_date_live", "user_id", "upload_date",
+            postgresql_where=text("is_deleted = false"), sqlite_where=text("is_deleted = false"),
+        ),
+        # archive_expired_media: oldest live uploads first, across all users
+        Index(
+            "ix_media_upload_date_live", "upload_date", "id",
+            postgresql_where=text("is_deleted = false"), sqlite_where=text("is_deleted = false"),
+        ),
+        # /mobile/media/changes: keyset over (updated_at, id) per user, tombstones included
+        Index("ix_media_user_updated", "user_id", "updated_at", "id"),
+        # blob refcount release, derivative bookkeeping and archiving look rows up by blob
+        Index("ix_media_blob_hash", "blob_hash"),
+        # orphan file collector and the deletion worker match files by path
+        Index("ix_media_stored_path", "stored_path"),
+        # /dashboard/search on original names
+        trigram_index("ix_media_original_name_trgm", "original_name"),
+        {"schema": "public"},
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, nullable=False)
     original_name = Column(String(255), nullable=False)
     stored_path = Column(String(1024), nullable=False)
+    # sha256 of the shared blob; NULL for uploads that predate the blob store
+    blob_hash = Column(String(64), nullable=True)
     media_type = Column(String(50), nullable=False)
     upload_date = Column(Date, nullable=False)
     added_by = Column(Integer, nullable=True)
-    is_deleted = Column(Boolean, nullable=False, server_default='false')
+    is_deleted = Column(Boolean, nullable=False, server_default=text('false'))
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
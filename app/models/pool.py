@@ -0,0 +1,102 @@
+# Connection pool instrumentation exposed through the diagnostics endpoint
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_errors = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.sessions_open = 0
+        self.sessions_total = 0
+        self.session_time_total = 0.0
+
+    def wait_started(self):
+        with self._lock:
+            self.waiting += 1
+
+    def wait_finished(self, elapsed: float, timed_out: bool):
+        with self._lock:
+            self.waiting -= 1
+            if timed_out:
+                self.checkout_timeouts += 1
+                return
+            self.checkouts += 1
+            self.checkout_wait_total += elapsed
+            if elapsed > self.checkout_wait_max:
+                self.checkout_wait_max = elapsed
+
+    def wait_failed(self):
+        # e.g. the database refused the connection: neither a checkout nor a pool timeout
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_errors += 1
+
+    def session_opened(self):
+        with self._lock:
+            self.sessions_open += 1
+            self.sessions_total += 1
+
+    def session_closed(self, elapsed: float):
+        with self._lock:
+            self.sessions_open -= 1
+            self.session_time_total += elapsed
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_errors": self.checkout_errors,
+                "checkout_wait_avg_ms": round(self.checkout_wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 3),
+                "sessions_open": self.sessions_open,
+                "sessions_total": self.sessions_total,
+                "session_avg_ms": round(self.session_time_total / self.sessions_total * 1000, 3) if self.sessions_total else 0.0,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        pool_metrics.wait_started()
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.wait_finished(time.perf_counter() - start, True)
+            raise
+        except BaseException:
+            pool_metrics.wait_failed()
+            raise
+        pool_metrics.wait_finished(time.perf_counter() - start, False)
+        return conn
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    status.update(pool_metrics.snapshot())
+    return status
@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, BigInteger, Date, TIMESTAMP, Index
+from sqlalchemy.sql import func
+from app.models import Base
+
+# Summary tables behind /dashboard/stats. Writers apply deltas in their own
+# transaction (app.services.stats); a periodic job recomputes them from scratch.
+
+
+class PlanStats(Base):
+    """Live subscriptions per plan; revenue is this count times the plan's current price."""
+    __tablename__ = "stats_plans"
+    __table_args__ = {"schema": "public"}
+    subscription_id = Column(Integer, primary_key=True)
+    subscriptions = Column(BigInteger, nullable=False, server_default='0')
+    active_subscriptions = Column(BigInteger, nullable=False, server_default='0')
+
+
+class UserStats(Base):
+    __tablename__ = "stats_users"
+    __table_args__ = (
+        # top subscribers by storage
+        Index("ix_stats_users_storage_bytes", "storage_bytes"),
+        {"schema": "public"},
+    )
+    user_id = Column(Integer, primary_key=True)
+    active_subscriptions = Column(BigInteger, nullable=False, server_default='0')
+    media_count = Column(BigInteger, nullable=False, server_default='0')
+    # logical bytes: a blob shared by several media rows counts once per row
+    storage_bytes = Column(BigInteger, nullable=False, server_default='0')
+
+
+class DailyUploadStats(Base):
+    __tablename__ = "stats_daily_uploads"
+    __table_args__ = {"schema": "public"}
+    upload_date = Column(Date, primary_key=True)
+    uploads = Column(BigInteger, nullable=False, server_default='0')
+    bytes = Column(BigInteger, nullable=False, server_default='0')
+
+
+class StatsCounter(Base):
+    """Global totals (active_subscribers, media, storage_bytes) kept as single rows."""
+    __tablename__ = "stats_counters"
+    __table_args__ = {"schema": "public"}
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, server_default='0')
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -1,17 +1,22 @@
 from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Boolean, Numeric
-from sqlalchemy.sql import func
-from app.models import Base
+from sqlalchemy.sql import func, text
+from app.models import Base, trigram_index
 
 
 class MasterSubscription(Base):
     __tablename__ = "master_subscriptions"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        trigram_index("ix_master_subscriptions_name_trgm", "subscription_name"),
+        {"schema": "public"},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     subscription_name = Column(String(150), nullable=False)
     description = Column(Text, nullable=True)
     price = Column(Numeric(10, 2), nullable=False)
     duration = Column(Integer, nullable=False)
-    active = Column(Boolean, nullable=False, server_default='true')
+    active = Column(Boolean, nullable=False, server_default=text('true'))
+    # days subscriber media stays on the hot tier before its originals are archived; NULL keeps it forever
+    retention_days = Column(Integer, nullable=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, TIMESTAMP
+from sqlalchemy.sql import func
+from app.models import Base
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    __table_args__ = {"schema": "public"}
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    upload_date = Column(Date, nullable=False)
+    original_name = Column(String(255), nullable=False)
+    content_type = Column(String(255), nullable=True)
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    total_chunks = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=True)
+    status = Column(String(20), nullable=False, server_default='open')
+    media_id = Column(Integer, nullable=True)
+    created_by = Column(Integer, nullable=True)
+    expires_at = Column(TIMESTAMP, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
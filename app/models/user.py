@@ -1,12 +1,20 @@
 
 
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Boolean
-from sqlalchemy.sql import func
-from app.models import Base
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Boolean, Index
+from sqlalchemy.sql import func, text
+from app.models import Base, trigram_index
 
 class User(Base):
     __tablename__ = "users"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        # login and the add-user uniqueness check look users up by name
+        Index("ix_users_user_name", "user_name"),
+        # list_users and /dashboard/search: ilike '%q%' and word similarity
+        trigram_index("ix_users_user_name_trgm", "user_name"),
+        trigram_index("ix_users_email_trgm", "email"),
+        trigram_index("ix_users_phone_trgm", "phone"),
+        {"schema": "public"},
+    )
     user_id = Column(Integer, primary_key=True, autoincrement=True)
     user_name = Column(String(100), nullable=False)
     email = Column(String(150), unique=True, nullable=False)
@@ -14,6 +22,7 @@ class User(Base):
     role = Column(String(50), nullable=False)
     password = Column(Text, nullable=False)
     auth_token = Column(Text)
-    active = Column(Boolean, nullable=False, server_default='true')
+    token_version = Column(Integer, nullable=False, server_default='0')
+    active = Column(Boolean, nullable=False, server_default=text('true'))
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -1,11 +1,28 @@
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Boolean, ForeignKey
-from sqlalchemy.sql import func
-from app.models import Base
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Boolean, ForeignKey, Index
+from sqlalchemy.sql import func, text
+from app.models import Base, trigram_index
+
+# subscription_status values the backend itself sets
+ACTIVE = "Active"
+EXPIRED = "Expired"
 
 
 class UserSubscription(Base):
     __tablename__ = "user_subscriptions"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        Index(
+            "ix_user_subscriptions_user_live", "user_id",
+            postgresql_where=text("is_deleted = false"), sqlite_where=text("is_deleted = false"),
+        ),
+        # expiry scheduler: Active live rows in end_date order
+        Index(
+            "ix_user_subscriptions_active_end", "end_date",
+            postgresql_where=text("subscription_status = 'Active' AND is_deleted = false"),
+            sqlite_where=text("subscription_status = 'Active' AND is_deleted = false"),
+        ),
+        trigram_index("ix_user_subscriptions_payment_method_trgm", "payment_method"),
+        {"schema": "public"},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("public.users.user_id"), nullable=False)
@@ -13,7 +30,7 @@ class UserSubscription(Base):
     start_datetime = Column(TIMESTAMP, nullable=False)
     end_date = Column(TIMESTAMP, nullable=False)
     payment_method = Column(String(50), nullable=False)
-    is_deleted = Column(Boolean, nullable=False, server_default='false')
+    is_deleted = Column(Boolean, nullable=False, server_default=text('false'))
     subscription_status = Column(String(50), nullable=False, server_default='Active')
     added_by = Column(Integer, ForeignKey("public.users.user_id"), nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
@@ -0,0 +1,275 @@
+# Retention: move old originals into zip batches on the archive tier and restore them on demand
+#
+# Only blob-backed media is archived. Rows from before the blob store
+# (blob_hash NULL) need migrate_blobs.py first, and a migrated upload's old
+# path stays a hard link to the blob, so archiving it frees no space until that
+# row is released. Zip batches are append-only: an archived blob whose last
+# reference goes away leaves its entry behind, and no zip is ever deleted.
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app.config.config import settings
+from app.models import SessionLocal
+from app.models.advertisement import Advertisement
+from app.models.blob import Blob
+from app.models.media import Media
+from app.models.subscription import MasterSubscription
+from app.models.user_subscription import UserSubscription
+from app.services.file_gc import queue_deletion
+from app.services.storage import ensure_dir, iter_file, upload_root, write_chunks
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = ".archive.lock"
+# already compressed formats are stored as-is; deflating them only burns CPU
+_STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".mp4", ".mov", ".m4v", ".webm", ".mp3", ".m4a", ".zip", ".gz"}
+
+_restore_locks = {}
+_restore_locks_guard = threading.Lock()
+
+
+def archive_root() -> Path:
+    return Path.cwd() / settings.ARCHIVE_DIR
+
+
+def _min_retention(db) -> int | None:
+    days = [d for d in db.execute(select(MasterSubscription.retention_days).distinct()).scalars() if d is not None]
+    if settings.MEDIA_RETENTION_DEFAULT_DAYS is not None:
+        days.append(settings.MEDIA_RETENTION_DEFAULT_DAYS)
+    return min(days) if days else None
+
+
+def _load_retention(db, user_ids, cache: dict):
+    """Fill ``cache`` with each user's retention in days (None = keep forever).
+
+    A user with several subscriptions gets the most generous plan; users
+    without any fall back to MEDIA_RETENTION_DEFAULT_DAYS.
+    """
+    missing = [u for u in set(user_ids) if u not in cache]
+    if not missing:
+        return
+    plans = {}
+    rows = db.execute(
+        select(UserSubscription.user_id, MasterSubscription.retention_days)
+        .join(MasterSubscription, MasterSubscription.id == UserSubscription.subscription_id)
+        .where(UserSubscription.user_id.in_(missing), UserSubscription.is_deleted == False)
+    )
+    for user_id, days in rows:
+        plans.setdefault(user_id, []).append(days)
+    for user_id in missing:
+        days = plans.get(user_id)
+        if not days:
+            cache[user_id] = settings.MEDIA_RETENTION_DEFAULT_DAYS
+        else:
+            cache[user_id] = None if any(d is None for d in days) else max(days)
+
+
+def _expired(user_id: int, upload_date: date, retention: dict, today: date) -> bool:
+    days = retention[user_id]
+    return days is not None and upload_date < today - timedelta(days=days)
+
+
+def _archivable(db, hashes, retention: dict, today: date) -> list:
+    """Blobs among ``hashes`` whose every live reference is past its owner's retention."""
+    refs = db.execute(
+        select(Media.blob_hash, Media.user_id, Media.upload_date)
+        .where(Media.blob_hash.in_(hashes), Media.is_deleted == False)
+    ).all()
+    _load_retention(db, [r.user_id for r in refs], retention)
+    keep = {r.blob_hash for r in refs if not _expired(r.user_id, r.upload_date, retention, today)}
+    # advertisements have no retention policy
+    keep.update(db.execute(
+        select(Advertisement.blob_hash).where(Advertisement.blob_hash.in_(hashes), Advertisement.is_deleted == False)
+    ).scalars())
+    return db.execute(
+        select(Blob.sha256, Blob.stored_path, Blob.size, Blob.archive_path)
+        .where(Blob.sha256.in_([h for h in hashes if h not in keep]), Blob.archived_at.is_(None))
+    ).all()
+
+
+def _write_batch(blobs) -> tuple[str, list]:
+    """Write the blobs' originals into one new zip; returns its path and the blobs it holds."""
+    now = datetime.utcnow()
+    rel = f"{now:%Y/%m}/{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.zip"
+    dest = archive_root() / rel
+    ensure_dir(dest.parent)
+    written = []
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=".archive-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            with zipfile.ZipFile(out, "w", allowZip64=True) as zf:
+                for blob in blobs:
+                    src = upload_root() / blob.stored_path
+                    if not src.is_file():
+                        continue
+                    name = Path(blob.stored_path).name
+                    method = zipfile.ZIP_STORED if Path(name).suffix.lower() in _STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                    zf.write(src, arcname=name, compress_type=method)
+                    written.append(blob)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_name, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    return rel, written
+
+
+def _commit_batch(db, batch) -> tuple[int, int]:
+    """Archive one batch: write the zip (unless every blob already has one), then flag the blobs and queue the hot copies for deletion."""
+    fresh = [b for b in batch if not b.archive_path]
+    archive_path, written = _write_batch(fresh) if fresh else (None, [])
+    paths = {b.sha256: archive_path for b in written}
+    paths.update({b.sha256: b.archive_path for b in batch if b.archive_path})
+    if not paths:
+        return 0, 0
+    now = datetime.utcnow()
+    rows = db.execute(
+        select(Blob).where(Blob.sha256.in_(list(paths)), Blob.archived_at.is_(None)).with_for_update()
+    ).scalars().all()
+    for blob in rows:
+        blob.archive_path = paths[blob.sha256]
+        blob.archived_at = now
+    queue_deletion(db, [blob.stored_path for blob in rows])
+    db.commit()
+    return len(rows), sum(blob.size for blob in rows)
+
+
+def archive_expired_media(dry_run: bool = False, max_seconds: float | None = None) -> dict | None:
+    """Move originals past their plan's retention to the archive tier.
+
+    Streams live Media rows oldest ``upload_date`` first. A blob is archived
+    only when every row that uses it has expired. Variants stay on the hot
+    tier. With ``dry_run`` nothing is written; the report shows what would move.
+    """
+    if not settings.ARCHIVE_ENABLED and not dry_run:
+        return None
+    max_seconds = settings.ARCHIVE_MAX_SECONDS if max_seconds is None else max_seconds
+    ensure_dir(archive_root())
+    with open(archive_root() / LOCK_FILE, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return _run(dry_run, max_seconds)
+
+
+def _run(dry_run: bool, max_seconds: float) -> dict:
+    started = time.monotonic()
+    today = date.today()
+    report = {
+        "dry_run": dry_run, "rows_scanned": 0, "blobs": 0, "bytes": 0,
+        "oldest_upload_date": None, "newest_upload_date": None, "finished": True,
+    }
+    reader = SessionLocal()
+    writer = SessionLocal()
+    try:
+        min_days = _min_retention(reader)
+        if min_days is None:
+            return report
+        horizon = today - timedelta(days=min_days)
+        stmt = (
+            select(Media.blob_hash, Media.user_id, Media.upload_date)
+            .join(Blob, Blob.sha256 == Media.blob_hash)
+            .where(Media.is_deleted == False, Media.upload_date < horizon, Blob.archived_at.is_(None))
+            .order_by(Media.upload_date, Media.id)
+            .execution_options(yield_per=1000)
+        )
+        retention = {}
+        seen = set()
+        batch, batch_bytes = [], 0
+        for partition in reader.execute(stmt).partitions():
+            report["rows_scanned"] += len(partition)
+            _load_retention(writer, [r.user_id for r in partition], retention)
+            candidates = []
+            for row in partition:
+                if row.blob_hash in seen or not _expired(row.user_id, row.upload_date, retention, today):
+                    continue
+                seen.add(row.blob_hash)
+                candidates.append(row.blob_hash)
+                if report["oldest_upload_date"] is None:
+                    report["oldest_upload_date"] = row.upload_date
+                report["newest_upload_date"] = row.upload_date
+            for blob in (_archivable(writer, candidates, retention, today) if candidates else []):
+                if dry_run:
+                    report["blobs"] += 1
+                    report["bytes"] += blob.size
+                    continue
+                batch.append(blob)
+                batch_bytes += blob.size
+                if len(batch) >= settings.ARCHIVE_BATCH_FILES or batch_bytes >= settings.ARCHIVE_BATCH_BYTES:
+                    count, size = _commit_batch(writer, batch)
+                    report["blobs"] += count
+                    report["bytes"] += size
+                    batch, batch_bytes = [], 0
+            if time.monotonic() - started >= max_seconds:
+                report["finished"] = False
+                break
+        if batch:
+            count, size = _commit_batch(writer, batch)
+            report["blobs"] += count
+            report["bytes"] += size
+    finally:
+        reader.close()
+        writer.close()
+    elapsed = time.monotonic() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows_scanned"] / elapsed, 1) if elapsed else None
+    report["bytes_per_second"] = round(report["bytes"] / elapsed) if elapsed else None
+    logger.info(
+        "Archive %s: %d rows scanned, %d blobs (%d bytes) %s in %.1fs",
+        "dry run" if dry_run else "run", report["rows_scanned"], report["blobs"], report["bytes"],
+        "eligible" if dry_run else "archived", elapsed,
+    )
+    return report
+
+
+def _restore_lock(sha256: str) -> threading.Lock:
+    with _restore_locks_guard:
+        return _restore_locks.setdefault(sha256, threading.Lock())
+
+
+def restore_blob(sha256: str) -> bool:
+    """Copy an archived original back to the hot tier; True if it is there afterwards.
+
+    The blob row stays locked while extracting, so the deletion worker cannot
+    remove the restored file, and concurrent requests for the same blob
+    extract it only once.
+    """
+    lock = _restore_lock(sha256)
+    with lock:
+        db = SessionLocal()
+        try:
+            blob = db.execute(select(Blob).where(Blob.sha256 == sha256).with_for_update()).scalar_one_or_none()
+            if blob is None or not blob.archive_path:
+                return False
+            dest = upload_root() / blob.stored_path
+            if not dest.exists():
+                with zipfile.ZipFile(archive_root() / blob.archive_path) as zf:
+                    with zf.open(Path(blob.stored_path).name) as src:
+                        write_chunks(iter_file(src), dest)
+            blob.archived_at = None
+            db.commit()
+            logger.info("Restored blob %s from %s", sha256, blob.archive_path)
+            return True
+        except (OSError, KeyError, zipfile.BadZipFile):
+            logger.exception("Could not restore blob %s", sha256)
+            db.rollback()
+            return False
+        finally:
+            db.close()
+            with _restore_locks_guard:
+                _restore_locks.pop(sha256, None)
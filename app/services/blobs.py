@@ -0,0 +1,206 @@
+# Content-addressed blob store: each distinct file is kept once under
+# blobs/<aa>/<bb>/<sha256><ext> and shared through a reference count.
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fastapi import UploadFile
+from sqlalchemy import delete, update
+
+from app.models import dialect_insert
+from app.models.blob import Blob
+from app.models.blob_variant import BlobVariant
+from app.services.file_gc import TRASH_DIR, queue_deletion
+from app.services.storage import UploadBudget, ensure_dir, iter_file, remove_files, upload_root, write_chunks
+
+BLOBS_DIR = "blobs"
+
+_EXT_RE = re.compile(r"^\.[A-Za-z0-9]{1,10}$")
+
+
+@dataclass
+class StagedBlob:
+    """A fully written, hashed upload waiting to be moved into the blob store."""
+    tmp_path: Path
+    size: int
+    sha256: str
+    ext: str
+    # set by ``add_refs`` when this upload created the blob file
+    placed: Path | None = None
+
+
+def blobs_root() -> Path:
+    return upload_root() / BLOBS_DIR
+
+
+def blob_path(sha256: str, ext: str = "") -> str:
+    """Path of a blob relative to UPLOADS_DIR."""
+    return f"{BLOBS_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def file_ext(filename: str | None) -> str:
+    # The extension only lets static file serving pick a content type
+    ext = Path(filename or "").suffix.lower()
+    return ext if _EXT_RE.match(ext) else ""
+
+
+def stage(chunks, filename: str, budget: UploadBudget | None = None) -> StagedBlob:
+    """Stream ``chunks`` to a temporary file, hashing as they are written."""
+    dest = blobs_root() / ".incoming" / f"{uuid.uuid4().hex}.part"
+    stored = write_chunks(chunks, dest, budget=budget, filename=filename)
+    return StagedBlob(tmp_path=stored.path, size=stored.size, sha256=stored.sha256, ext=file_ext(filename))
+
+
+def stage_upload(upload: UploadFile, budget: UploadBudget | None = None) -> StagedBlob:
+    return stage(iter_file(upload.file), upload.filename or "", budget=budget)
+
+
+def discard(staged):
+    """Remove staged uploads and any blob files ``add_refs`` placed for them.
+
+    Call it before rolling back: on Postgres the uncommitted blob row is
+    still locked, so a concurrent upload of the same content cannot adopt a
+    placed file that is about to be removed.
+    """
+    staged = list(staged)
+    remove_files([s.tmp_path for s in staged] + [s.placed for s in staged if s.placed])
+
+
+def add_refs(db, staged) -> dict[str, str]:
+    """Take one reference per staged upload and move new content into place.
+
+    Runs inside the caller's transaction. The upsert locks each blob row until
+    the caller commits, so a concurrent ``release`` of the same content
+    cannot remove the file after it has been placed here. Returns
+    ``{sha256: stored_path}``. A blob that already exists keeps its original
+    path and the staged copy is dropped. Newly placed files are recorded on
+    the staged uploads, so ``discard`` removes them if the caller fails.
+    """
+    staged = list(staged)
+    counts = Counter(s.sha256 for s in staged)
+    paths = {}
+    for s in staged:
+        if s.sha256 in paths:
+            continue
+        stmt = dialect_insert(db, Blob).values(sha256=s.sha256, size=s.size, stored_path=blob_path(s.sha256, s.ext), ref_count=counts[s.sha256])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            # content uploaded again is hot again, even if it had been archived
+            set_={"ref_count": Blob.ref_count + counts[s.sha256], "archived_at": None},
+        ).returning(Blob.stored_path)
+        paths[s.sha256] = db.execute(stmt).scalar_one()
+    for s in staged:
+        final = upload_root() / paths[s.sha256]
+        if final.exists():
+            # refresh mtime so the orphan collector treats the blob as new
+            os.utime(final)
+            s.tmp_path.unlink(missing_ok=True)
+        elif s.tmp_path.exists():
+            ensure_dir(final.parent)
+            os.replace(s.tmp_path, final)
+            s.placed = final
+    return paths
+
+
+@dataclass
+class PendingRemoval:
+    """Blob files moved aside by ``release``; ``undo`` restores them if the transaction rolls back."""
+    moved: list[tuple[Path, Path]] = field(default_factory=list)
+
+    def undo(self):
+        for trash, original in self.moved:
+            try:
+                os.replace(trash, original)
+            except OSError:
+                pass
+
+
+def release(db, row) -> PendingRemoval:
+    """Drop ``row``'s reference to its file.
+
+    Uploads from before the blob store own their file outright. Blob-backed
+    rows decrement the count, and the last reference removes the blob and its
+    variants. Their files are moved aside under the row lock, so they stop
+    being served at once. Every file to remove is queued in the caller's
+    transaction for the deletion worker.
+    """
+    pending = PendingRemoval()
+    if not row.blob_hash:
+        queue_deletion(db, [row.stored_path])
+        return pending
+    released = db.execute(
+        update(Blob)
+        .where(Blob.sha256 == row.blob_hash)
+        .values(ref_count=Blob.ref_count - 1)
+        .returning(Blob.ref_count, Blob.stored_path)
+    ).first()
+    if released is None:
+        queue_deletion(db, [row.stored_path])
+        return pending
+    remaining, stored_path = released
+    if Path(row.stored_path).as_posix() != stored_path:
+        # a migrated upload keeps its old name as a hard link to the blob
+        queue_deletion(db, [row.stored_path])
+    if remaining <= 0:
+        db.execute(delete(Blob).where(Blob.sha256 == row.blob_hash))
+        variant_paths = db.execute(
+            delete(BlobVariant).where(BlobVariant.blob_hash == row.blob_hash).returning(BlobVariant.stored_path)
+        ).scalars().all()
+        for path in [stored_path, *variant_paths]:
+            _move_to_trash(db, path, pending)
+    return pending
+
+
+def _move_to_trash(db, stored_path: str, pending: PendingRemoval):
+    original = upload_root() / stored_path
+    trash = f"{TRASH_DIR}/{original.name}-{uuid.uuid4().hex}"
+    ensure_dir(upload_root() / TRASH_DIR)
+    try:
+        os.replace(original, upload_root() / trash)
+    except FileNotFoundError:
+        return
+    # os.replace keeps the old mtime; until the caller commits, the file is
+    # in neither the blob table nor the deletion queue, so the orphan
+    # collector's grace period must start now
+    os.utime(upload_root() / trash)
+    pending.moved.append((upload_root() / trash, original))
+    queue_deletion(db, [trash])
+
+
+def adopt_file(db, path: Path, sha256: str, size: int) -> tuple[str, bool]:
+    """Take a reference on ``path``'s content for a pre-existing upload.
+
+    The first copy of some content becomes the blob via a hard link. Later
+    copies are replaced by a hard link to that blob, so every old URL keeps
+    resolving while the data is stored once. Returns ``(stored_path,
+    deduplicated)``, where ``deduplicated`` means a duplicate copy was
+    released.
+    """
+    stmt = dialect_insert(db, Blob).values(sha256=sha256, size=size, stored_path=blob_path(sha256, file_ext(path.name)), ref_count=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Blob.sha256],
+        set_={"ref_count": Blob.ref_count + 1},
+    ).returning(Blob.stored_path)
+    stored_path = db.execute(stmt).scalar_one()
+    final = upload_root() / stored_path
+    if not final.exists():
+        ensure_dir(final.parent)
+        try:
+            os.link(path, final)
+        except OSError:
+            # different filesystem: keep an independent copy
+            shutil.copy2(path, final)
+        return stored_path, False
+    if os.path.samefile(path, final):
+        return stored_path, False
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.link")
+    try:
+        os.link(final, tmp)
+    except OSError:
+        return stored_path, False
+    os.replace(tmp, path)
+    return stored_path, True
@@ -0,0 +1,127 @@
+# Process-local cache of the master subscription catalog.
+#
+# The catalog changes rarely, so every worker keeps it in memory together with
+# pre-serialized JSON. Writers bump a row in cache_versions in the same
+# transaction; workers poll that counter and reload when it moves.
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config.config import settings
+from app.models import SessionLocal, dialect_insert
+from app.models.cache_version import CacheVersion
+from app.models.subscription import MasterSubscription
+from app.services.responses import dumps
+
+CATALOG_VERSION_KEY = "subscriptions"
+
+
+def bump_version(db: Session, name: str):
+    """Increment a cache version inside the caller's transaction.
+
+    A single upsert, so concurrent first writers both succeed instead of one
+    hitting a primary-key violation.
+    """
+    stmt = dialect_insert(db, CacheVersion).values(name=name, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[CacheVersion.name],
+        set_={"version": CacheVersion.version + 1, "updated_at": func.now()},
+    ))
+
+
+def read_version(db: Session, name: str) -> int:
+    version = db.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+    return version or 0
+
+
+class SubscriptionCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.items = []
+        self.by_id = {}
+        self.list_bytes = b"[]"
+        self.item_bytes = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._checked_at = 0.0
+
+    def needs_check(self) -> bool:
+        return self.version is None or time.monotonic() - self._checked_at >= settings.CATALOG_POLL_SECONDS
+
+    def refresh(self, force: bool = False):
+        """Reload from the DB if the shared version moved (or ``force``)."""
+        db = SessionLocal()
+        try:
+            version = read_version(db, CATALOG_VERSION_KEY)
+            if not force and version == self.version:
+                self._checked_at = time.monotonic()
+                return
+            rows = db.query(MasterSubscription).order_by(MasterSubscription.id).all()
+            items = [
+                {
+                    "id": s.id,
+                    "subscription_name": s.subscription_name,
+                    "description": s.description,
+                    "price": float(s.price),
+                    "duration": s.duration,
+                    "active": s.active,
+                    "retention_days": s.retention_days,
+                    "created_at": s.created_at,
+                    "updated_at": s.updated_at,
+                }
+                for s in rows
+            ]
+        finally:
+            db.close()
+        by_id = {item["id"]: item for item in items}
+        item_bytes = {item["id"]: dumps(item) for item in items}
+        list_bytes = dumps(items)
+        with self._lock:
+            self.items = items
+            self.by_id = by_id
+            self.item_bytes = item_bytes
+            self.list_bytes = list_bytes
+            self.version = version
+            self.reloads += 1
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "items": len(self.items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+            }
+
+
+subscription_catalog = SubscriptionCatalog()
+
+
+async def get_catalog() -> SubscriptionCatalog:
+    """Return the catalog, reloading it first if another writer changed it."""
+    catalog = subscription_catalog
+    hit = True
+    if catalog.needs_check():
+        reloads = catalog.reloads
+        await run_in_threadpool(catalog.refresh)
+        hit = catalog.reloads == reloads
+    catalog.record(hit)
+    return catalog
@@ -0,0 +1,227 @@
+# Image variants (thumbnail, medium) rendered off the request path on a process pool
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from sqlalchemy import func, select, update
+from starlette.concurrency import run_in_threadpool
+
+from app.config.config import settings
+from app.models import SessionLocal, dialect_insert
+from app.models.async_session import fetch_all
+from app.models.advertisement import Advertisement
+from app.models.blob import Blob
+from app.models.blob_variant import BlobVariant
+from app.models.media import Media
+from app.services import signing
+from app.services.blobs import BLOBS_DIR
+from app.services.storage import remove_files, upload_root
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# blobs with a render in flight in this process, so duplicate uploads do not queue twice
+_inflight = set()
+
+_PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+
+def variant_sizes() -> dict[str, int]:
+    """Longest-side pixel limit for each variant."""
+    return {"medium": settings.IMAGE_MEDIUM_SIZE, "thumbnail": settings.IMAGE_THUMBNAIL_SIZE}
+
+
+def variant_formats() -> list[str]:
+    formats = [f.strip().lower() for f in settings.IMAGE_VARIANT_FORMATS.split(",")]
+    return [f for f in formats if f in _PIL_FORMATS]
+
+
+def variant_path(sha256: str, variant: str, fmt: str) -> str:
+    return f"{BLOBS_DIR}/variants/{sha256[:2]}/{sha256[2:4]}/{sha256}_{variant}{_EXTENSIONS[fmt]}"
+
+
+def _save(image, dest: Path, fmt: str, quality: int) -> int:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=".variant-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if fmt == "jpeg":
+                image.convert("RGB").save(out, _PIL_FORMATS[fmt], quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(out, _PIL_FORMATS[fmt], quality=quality, method=4)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    return dest.stat().st_size
+
+
+def render_variants(root: str, src: str, sha256: str, sizes: dict, formats: list, quality: int) -> list[dict]:
+    """Runs in a worker process: decode ``src`` once and write every variant.
+
+    Returns one metadata dict per file written. Variants that would be
+    larger than the original are skipped, apart from the smallest one.
+    """
+    # Pillow is only needed by the workers
+    from PIL import Image, ImageOps
+
+    written = []
+    with Image.open(Path(root) / src) as image:
+        # let the JPEG decoder downscale while decoding when the original is much larger
+        largest = max(sizes.values())
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        current = image
+        smallest = min(sizes, key=sizes.get)
+        for variant, limit in sorted(sizes.items(), key=lambda item: -item[1]):
+            if max(image.size) <= limit and variant != smallest:
+                continue
+            resized = current.copy()
+            resized.thumbnail((limit, limit), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                stored_path = variant_path(sha256, variant, fmt)
+                size = _save(resized, Path(root) / stored_path, fmt, quality)
+                written.append({
+                    "blob_hash": sha256,
+                    "variant": variant,
+                    "format": fmt,
+                    "width": resized.width,
+                    "height": resized.height,
+                    "size": size,
+                    "stored_path": stored_path,
+                })
+            current = resized
+    return written
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def submit(stored_path: str, sha256: str):
+    return _get_executor().submit(
+        render_variants, str(upload_root()), stored_path, sha256,
+        variant_sizes(), variant_formats(), settings.IMAGE_VARIANT_QUALITY,
+    )
+
+
+def missing_variants(db, hashes) -> list[str]:
+    present = set(db.execute(select(BlobVariant.blob_hash).where(BlobVariant.blob_hash.in_(hashes)).distinct()).scalars())
+    return [h for h in hashes if h not in present]
+
+
+def record(results: list[dict]):
+    """Store variant metadata and bump updated_at on the rows that use the blobs.
+
+    The blob rows are locked first; output for a blob that was deleted while
+    it was rendering is removed instead of recorded.
+    """
+    if not results:
+        return
+    hashes = sorted({r["blob_hash"] for r in results})
+    db = SessionLocal()
+    try:
+        live = set(db.execute(select(Blob.sha256).where(Blob.sha256.in_(hashes)).with_for_update()).scalars())
+        rows = [r for r in results if r["blob_hash"] in live]
+        if rows:
+            db.execute(dialect_insert(db, BlobVariant).values(rows).on_conflict_do_nothing())
+            # new thumbnails change list responses: invalidate ETags and surface them in delta sync
+            for model in (Media, Advertisement):
+                db.execute(update(model).where(model.blob_hash.in_(live)).values(updated_at=func.now()))
+        db.commit()
+    finally:
+        db.close()
+    remove_files(upload_root() / r["stored_path"] for r in results if r["blob_hash"] not in live)
+
+
+async def generate(blob_paths: dict[str, str]):
+    """Background task: render variants for ``{sha256: stored_path}`` images."""
+    if not settings.IMAGE_VARIANTS_ENABLED or not blob_paths or not variant_formats():
+        return
+    claimed = [h for h in blob_paths if h not in _inflight]
+    if not claimed:
+        return
+    _inflight.update(claimed)
+    try:
+        db = SessionLocal()
+        try:
+            hashes = await run_in_threadpool(missing_variants, db, claimed)
+        finally:
+            db.close()
+        futures = [asyncio.wrap_future(submit(blob_paths[h], h)) for h in hashes]
+        results = []
+        for sha256, outcome in zip(hashes, await asyncio.gather(*futures, return_exceptions=True)):
+            if isinstance(outcome, BaseException):
+                logger.warning("Could not render variants for blob %s: %s", sha256, outcome)
+                continue
+            results.extend(outcome)
+        await run_in_threadpool(record, results)
+    finally:
+        _inflight.difference_update(claimed)
+
+
+async def load_variants(db, hashes) -> dict[str, list]:
+    """Variants for a page of rows in one query, grouped by blob."""
+    hashes = {h for h in hashes if h}
+    grouped = {}
+    if not hashes:
+        return grouped
+    rows = await fetch_all(db, select(
+        BlobVariant.blob_hash, BlobVariant.variant, BlobVariant.format,
+        BlobVariant.width, BlobVariant.height, BlobVariant.size, BlobVariant.stored_path,
+    ).where(BlobVariant.blob_hash.in_(hashes)))
+    for row in rows:
+        grouped.setdefault(row.blob_hash, []).append(row)
+    return grouped
+
+
+def image_fields(variants, expires: int | None = None) -> dict:
+    """``thumbnail_url``, an ``srcset`` string in the preferred format and the full variant list."""
+    variants = sorted(variants or [], key=lambda v: v.width)
+    if not variants:
+        return {"thumbnail_url": None, "srcset": None, "variants": []}
+    formats = variant_formats()
+    rank = {fmt: i for i, fmt in enumerate(formats)}
+    preferred = min({v.format for v in variants}, key=lambda fmt: rank.get(fmt, len(rank)))
+    best = [v for v in variants if v.format == preferred]
+    thumbnail = next((v for v in best if v.variant == "thumbnail"), best[0])
+    return {
+        "thumbnail_url": signing.media_url(thumbnail.stored_path, expires),
+        "srcset": ", ".join(f"{signing.media_url(v.stored_path, expires)} {v.width}w" for v in best),
+        "variants": [
+            {
+                "variant": v.variant,
+                "format": v.format,
+                "url": signing.media_url(v.stored_path, expires),
+                "width": v.width,
+                "height": v.height,
+                "bytes": v.size,
+            }
+            for v in variants
+        ],
+    }
@@ -0,0 +1,83 @@
+# Streaming NDJSON / CSV exports over a server-side cursor
+import csv
+import io
+import zlib
+from datetime import date, datetime
+
+from fastapi.responses import StreamingResponse
+
+from app.config.config import settings
+from app.models import SessionLocal
+from app.services.pagination import rows_to_items
+from app.services.responses import dumps
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+# Spreadsheets evaluate cells starting with these as formulas
+_CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(_CSV_FORMULA_PREFIXES):
+        # names, emails and file names are user-controlled: quote them as text
+        return "'" + value
+    return value
+
+
+def _ndjson_chunk(items, names) -> bytes:
+    return b"".join(dumps(item) + b"\n" for item in items)
+
+
+def _csv_chunk(items, names) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_csv_cell(item[name]) for name in names] for item in items)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encoded_rows(db, stmt, field_map: dict, names: list[str], fmt: str):
+    encode = _csv_chunk if fmt == "csv" else _ndjson_chunk
+    if fmt == "csv":
+        yield _csv_chunk([dict(zip(names, names))], names)
+    result = db.execute(stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield encode(rows_to_items(partition, field_map, names), names)
+
+
+def iter_export(stmt, field_map: dict, names: list[str], fmt: str, compress: bool = False):
+    """Yield the encoded rows of ``stmt`` one fetch batch at a time.
+
+    ``stmt`` comes from projection(). Rows are streamed from a server-side
+    cursor (yield_per), so memory stays bounded by EXPORT_BATCH_SIZE however
+    large the result is. The export uses its own session because it
+    outlives the request handler.
+    """
+    db = SessionLocal()
+    try:
+        if not compress:
+            yield from _encoded_rows(db, stmt, field_map, names, fmt)
+            return
+        compressor = zlib.compressobj(settings.EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in _encoded_rows(db, stmt, field_map, names, fmt):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        db.close()
+
+
+def export_response(stmt, field_map: dict, names: list[str], fmt: str, compress: bool, name: str) -> StreamingResponse:
+    """Stream ``stmt`` as a downloadable NDJSON or CSV file (``.gz`` when ``compress``)."""
+    filename = f"{name}-{datetime.utcnow():%Y%m%d%H%M%S}.{fmt}" + (".gz" if compress else "")
+    return StreamingResponse(
+        iter_export(stmt, field_map, names, fmt, compress),
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
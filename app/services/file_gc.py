@@ -0,0 +1,219 @@
+# Deferred file deletion (queue + worker) and the orphan file collector
+import fcntl
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app.config.config import settings
+from app.models import SessionLocal
+from app.models.advertisement import Advertisement
+from app.models.blob import Blob
+from app.models.blob_variant import BlobVariant
+from app.models.file_deletion import FileDeletion
+from app.models.media import Media
+from app.services.storage import upload_root
+
+logger = logging.getLogger(__name__)
+
+# Checkpoint and lock for the orphan collector; hidden, so never served
+GC_STATE_FILE = ".gc-state"
+# Released blob files wait here for the deletion worker
+TRASH_DIR = "blobs/.trash"
+
+
+def queue_deletion(db, paths):
+    """Queue files (relative to UPLOADS_DIR) for deletion in the caller's transaction."""
+    now = datetime.utcnow()
+    for path in paths:
+        db.add(FileDeletion(stored_path=Path(path).as_posix(), not_before=now))
+
+
+def _unlink(path: Path) -> int:
+    """Remove ``path`` and return the bytes actually freed (0 for a missing file or a remaining hard link)."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return 0
+    path.unlink(missing_ok=True)
+    return st.st_size if st.st_nlink <= 1 else 0
+
+
+def process_deletions():
+    """Unlink one batch of queued files, retrying failures with exponential backoff.
+
+    Rows are claimed with SKIP LOCKED, so every worker process can run this
+    job at the same time.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        rows = db.execute(
+            select(FileDeletion)
+            .where(FileDeletion.not_before <= now)
+            .order_by(FileDeletion.id)
+            .limit(settings.FILE_DELETION_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        # an archived blob's hot copy is queued here; if the blob was restored or
+        # uploaded again since, it is in use. Locking the row orders this against both.
+        in_use = set(db.execute(
+            select(Blob.stored_path)
+            .where(Blob.stored_path.in_([row.stored_path for row in rows]), Blob.archived_at.is_(None))
+            .with_for_update()
+        ).scalars()) if rows else set()
+        reclaimed = deleted = 0
+        for row in rows:
+            if row.stored_path in in_use:
+                db.delete(row)
+                continue
+            try:
+                reclaimed += _unlink(upload_root() / row.stored_path)
+            except OSError as exc:
+                row.attempts += 1
+                if row.attempts >= settings.FILE_DELETION_MAX_ATTEMPTS:
+                    # the orphan collector picks the file up if it is still there
+                    logger.error("Giving up deleting %s after %d attempts: %s", row.stored_path, row.attempts, exc)
+                    db.delete(row)
+                else:
+                    row.last_error = str(exc)[:500]
+                    row.not_before = now + timedelta(seconds=settings.FILE_DELETION_RETRY_SECONDS * 2 ** (row.attempts - 1))
+                continue
+            deleted += 1
+            db.delete(row)
+        db.commit()
+        if deleted:
+            logger.info("Deleted %d queued files, reclaimed %d bytes", deleted, reclaimed)
+        return deleted, reclaimed
+    finally:
+        db.close()
+
+
+def _walk(directory: str, prefix: str, resume: list[str]):
+    """Yield ``(relative_path, DirEntry)`` for files in name order, one directory listing in memory at a time.
+
+    ``resume`` is the split checkpoint path; everything up to and including it is skipped.
+    """
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        sub_resume = []
+        if resume:
+            if entry.name < resume[0]:
+                continue
+            if entry.name == resume[0]:
+                sub_resume = resume[1:]
+                resume = []
+                if not sub_resume:
+                    continue
+            else:
+                resume = []
+        rel = prefix + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk(entry.path, rel + "/", sub_resume)
+        elif entry.is_file(follow_symlinks=False) and rel != GC_STATE_FILE:
+            yield rel, entry
+
+
+def _referenced(db, paths: list[str]) -> set[str]:
+    referenced = set()
+    for column, criteria in (
+        (Blob.stored_path, ()),
+        (BlobVariant.stored_path, ()),
+        (Media.stored_path, (Media.is_deleted == False,)),
+        (Advertisement.stored_path, (Advertisement.is_deleted == False,)),
+        # trash still queued for the deletion worker, which owns it
+        (FileDeletion.stored_path, ()),
+    ):
+        referenced.update(db.execute(select(column).where(column.in_(paths), *criteria)).scalars())
+    return referenced
+
+
+def _hidden(rel: str) -> bool:
+    return any(part.startswith(".") for part in rel.split("/"))
+
+
+def _collect_batch(db, batch, cutoff: float) -> tuple[int, int]:
+    # staging files (blobs/.incoming) are never referenced by a row. Trash is
+    # checked against the deletion queue: only files the worker gave up on are ours.
+    candidates = [rel for rel, _ in batch if not _hidden(rel) or rel.startswith(TRASH_DIR + "/")]
+    referenced = _referenced(db, candidates) if candidates else set()
+    removed = reclaimed = 0
+    for rel, entry in batch:
+        if rel in referenced:
+            continue
+        try:
+            # re-check just before unlinking: a new upload of the same content refreshes the blob's mtime
+            if os.stat(entry.path, follow_symlinks=False).st_mtime > cutoff:
+                continue
+            reclaimed += _unlink(Path(entry.path))
+            removed += 1
+        except OSError as exc:
+            logger.warning("Could not remove orphan %s: %s", rel, exc)
+    return removed, reclaimed
+
+
+def collect_orphans(max_seconds: float | None = None):
+    """Delete files under UPLOADS_DIR that no row references.
+
+    Walks the tree in name order with os.scandir and checks paths against the
+    database in batches. A run stops after ORPHAN_GC_MAX_SECONDS and saves
+    its position, so each pass over millions of files is split across runs.
+    Only one process per host walks the tree at a time.
+    """
+    if not settings.ORPHAN_GC_ENABLED:
+        return None
+    root = upload_root()
+    if not root.is_dir():
+        return None
+    max_seconds = settings.ORPHAN_GC_MAX_SECONDS if max_seconds is None else max_seconds
+    deadline = time.monotonic() + max_seconds
+    cutoff = time.time() - settings.ORPHAN_GC_GRACE_SECONDS
+    with open(root / GC_STATE_FILE, "a+") as state:
+        try:
+            fcntl.flock(state, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        state.seek(0)
+        checkpoint = state.read().strip()
+        db = SessionLocal()
+        scanned = removed = reclaimed = 0
+        last = checkpoint
+        finished = False
+        try:
+            if not any(db.execute(select(column).limit(1)).first() for column in (Blob.sha256, Media.id, Advertisement.id)):
+                # most likely pointed at the wrong database: every file would look orphaned
+                logger.warning("Orphan GC skipped: no media, advertisement or blob rows found")
+                return None
+            batch = []
+            for rel, entry in _walk(str(root), "", checkpoint.split("/") if checkpoint else []):
+                scanned += 1
+                try:
+                    if entry.stat(follow_symlinks=False).st_mtime <= cutoff:
+                        batch.append((rel, entry))
+                except FileNotFoundError:
+                    pass
+                last = rel
+                if len(batch) >= settings.ORPHAN_GC_BATCH_SIZE:
+                    r, b = _collect_batch(db, batch, cutoff)
+                    removed, reclaimed, batch = removed + r, reclaimed + b, []
+                if time.monotonic() >= deadline:
+                    break
+            else:
+                finished = True
+            if batch:
+                r, b = _collect_batch(db, batch, cutoff)
+                removed, reclaimed = removed + r, reclaimed + b
+        finally:
+            db.close()
+            state.seek(0)
+            state.truncate()
+            state.write("" if finished else last)
+    logger.info(
+        "Orphan GC %s: scanned %d files, removed %d, reclaimed %d bytes",
+        "finished a pass" if finished else f"paused at {last}", scanned, removed, reclaimed,
+    )
+    return {"scanned": scanned, "removed": removed, "reclaimed_bytes": reclaimed, "finished": finished}
@@ -0,0 +1,91 @@
+# HTTP conditional requests (ETag / Last-Modified / 304) for read endpoints
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+
+from app.models.async_session import fetch_first
+
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def fingerprint_statement(model, *criteria):
+    """max(updated_at) and row count of a filtered set; both change whenever a
+    row in the set is inserted, updated, soft-deleted or removed."""
+    return select(func.max(model.updated_at), func.count()).select_from(model).where(*criteria)
+
+
+async def collection_fingerprint(db, model, *criteria):
+    row = await fetch_first(db, fingerprint_statement(model, *criteria))
+    return row[0], row[1]
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        # TIMESTAMP columns are stored as naive UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+class Conditional:
+    """Dependency that applies validators to the response and short-circuits with 304.
+
+    Usage in a handler::
+
+        not_modified = cond.evaluate(etag)
+        if not_modified:
+            return not_modified
+    """
+
+    def __init__(self, request: Request, response: Response):
+        self.request = request
+        self.response = response
+        # validator headers, for handlers that return their own Response
+        self.headers = {}
+
+    def _etag_matches(self, etag: str) -> bool | None:
+        header = self.request.headers.get("if-none-match")
+        if header is None:
+            return None
+        if header.strip() == "*":
+            return True
+        candidates = [c.strip() for c in header.split(",")]
+        # weak comparison, as required for If-None-Match
+        return any(c.removeprefix("W/") == etag for c in candidates)
+
+    def _not_modified_since(self, last_modified: datetime) -> bool:
+        header = self.request.headers.get("if-modified-since")
+        if not header:
+            return False
+        try:
+            since = parsedate_to_datetime(header)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+
+    def evaluate(self, etag: str, last_modified: datetime | None = None, cache_control: str = DEFAULT_CACHE_CONTROL) -> Response | None:
+        """Set ETag/Cache-Control (and Last-Modified) and return a 304 response if the client copy is current.
+
+        Only pass ``last_modified`` for single resources: a set's newest
+        ``updated_at`` does not move when a row is hard-deleted.
+        """
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if last_modified is not None:
+            headers["Last-Modified"] = _http_date(last_modified)
+        self.headers = headers
+        self.response.headers.update(headers)
+        matches = self._etag_matches(etag)
+        if matches is None and last_modified is not None:
+            matches = self._not_modified_since(last_modified)
+        if matches:
+            return Response(status_code=304, headers=headers)
+        return None
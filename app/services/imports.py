@@ -0,0 +1,247 @@
+# Bulk user import: streaming parse, set-based duplicate checks, staged bulk load
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table, Text, insert, or_, select
+
+from app.config.config import settings
+from app.models import SessionLocal, dialect_insert
+from app.models.user import User
+from app.models.user_subscription import UserSubscription
+from app.services import passwords, stats
+from app.services.catalog import subscription_catalog
+from app.services.subscriptions import ACTIVE
+
+USER_COLUMNS = ("user_name", "email", "phone", "role", "password", "active")
+
+# one per batch, created and dropped inside the batch's transaction
+_staging = Table(
+    "user_import_staging", MetaData(),
+    Column("row_no", Integer, nullable=False),
+    Column("user_name", String(100), nullable=False),
+    Column("email", String(150), nullable=False),
+    Column("phone", String(30)),
+    Column("role", String(50), nullable=False),
+    Column("password", Text, nullable=False),
+    Column("active", Boolean, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+_STAGING_COLUMNS = [c.name for c in _staging.columns]
+_COPY_CSV = f"COPY {_staging.name} ({', '.join(_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+_COPY_TEXT = f"COPY {_staging.name} ({', '.join(_STAGING_COLUMNS)}) FROM STDIN"
+
+
+class ImportRow(BaseModel):
+    user_name: str = Field(min_length=1, max_length=100)
+    email: EmailStr
+    phone: str | None = Field(None, max_length=30)
+    role: str = Field(min_length=1, max_length=50)
+    password: str = Field(min_length=1)
+    active: bool = True
+    # optional: also give the new user a subscription
+    subscription_id: int | None = None
+    start_datetime: datetime | None = None
+    end_date: datetime | None = None
+    payment_method: str | None = Field(None, max_length=50)
+
+
+def _read_rows(fileobj, fmt: str):
+    """Yield ``(row_no, record)`` one row at a time; ``record`` is an error string for unparseable rows.
+
+    CSV rows are numbered from the first data row, NDJSON rows by line.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row_no, record in enumerate(csv.DictReader(text), 1):
+            if None in record:
+                yield row_no, "More values than header columns"
+                continue
+            yield row_no, {key.strip(): value.strip() for key, value in record.items() if value and value.strip()}
+        return
+    for row_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row_no, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield row_no, "Expected a JSON object"
+            continue
+        yield row_no, record
+
+
+def _validate(record: dict, plan_ids) -> tuple[ImportRow | None, list[str]]:
+    try:
+        row = ImportRow.model_validate(record)
+    except ValidationError as exc:
+        return None, [f"{'.'.join(str(p) for p in e['loc']) or 'row'}: {e['msg']}" for e in exc.errors()]
+    errors = []
+    if len(row.email) > 150:
+        errors.append("email: String should have at most 150 characters")
+    if row.subscription_id is not None:
+        if row.subscription_id not in plan_ids:
+            errors.append("subscription_id: unknown subscription")
+        if row.end_date is None:
+            errors.append("end_date: required with subscription_id")
+    return row, errors
+
+
+def _existing(db, rows) -> tuple[set, set]:
+    """User names and emails among ``rows`` that are already taken, in one query."""
+    names = {row.user_name for _, row in rows}
+    emails = {row.email for _, row in rows}
+    found = db.execute(
+        select(User.user_name, User.email).where(or_(User.user_name.in_(names), User.email.in_(emails)))
+    ).all()
+    return {f.user_name for f in found}, {f.email for f in found}
+
+
+def _copy(conn, records: list[tuple]):
+    """Bulk-load staging rows: COPY on Postgres, executemany elsewhere."""
+    if conn.dialect.name == "postgresql":
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(records)
+                buffer.seek(0)
+                cursor.copy_expert(_COPY_CSV, buffer)
+                return
+            if hasattr(cursor, "copy"):  # psycopg 3
+                with cursor.copy(_COPY_TEXT) as copy:
+                    for record in records:
+                        copy.write_row(record)
+                return
+        finally:
+            cursor.close()
+    conn.execute(insert(_staging), [dict(zip(_STAGING_COLUMNS, record)) for record in records])
+
+
+def _load_batch(db, rows, hashes, added_by: int) -> tuple[dict, int]:
+    """Stage one batch and move it into users with a single INSERT ... SELECT.
+
+    Returns ``{email: user_id}`` for the users created and the number of
+    subscriptions added. Rows that collide with a user created concurrently
+    are left out of the result.
+    """
+    conn = db.connection()
+    _staging.drop(conn, checkfirst=True)
+    _staging.create(conn)
+    _copy(conn, [
+        (row_no, row.user_name, row.email, row.phone, row.role, hashed, row.active)
+        for (row_no, row), hashed in zip(rows, hashes)
+    ])
+    staged = _staging.c
+    taken = select(User.user_id).where(or_(User.user_name == staged.user_name, User.email == staged.email)).exists()
+    stmt = (
+        dialect_insert(db, User)
+        .from_select(
+            list(USER_COLUMNS),
+            select(staged.user_name, staged.email, staged.phone, staged.role, staged.password, staged.active)
+            .where(~taken)
+            .order_by(staged.row_no),
+        )
+        .on_conflict_do_nothing()
+        .returning(User.user_id, User.email)
+    )
+    created = {r.email: r.user_id for r in db.execute(stmt)}
+    _staging.drop(conn)
+    now = datetime.utcnow()
+    subscriptions = [
+        {
+            "user_id": created[row.email],
+            "subscription_id": row.subscription_id,
+            "start_datetime": row.start_datetime or now,
+            "end_date": row.end_date,
+            "payment_method": row.payment_method or "import",
+            "subscription_status": ACTIVE,
+            "added_by": added_by,
+        }
+        for _, row in rows
+        if row.subscription_id is not None and row.email in created
+    ]
+    if subscriptions:
+        db.execute(insert(UserSubscription), subscriptions)
+        stats.subscriptions_changed(db, added=[(sub["user_id"], sub["subscription_id"], True) for sub in subscriptions])
+    return created, len(subscriptions)
+
+
+def import_users(fileobj, fmt: str, added_by: int, dry_run: bool = False) -> dict:
+    """Create users (and optionally their subscriptions) from a CSV or NDJSON file.
+
+    The file is read and validated one batch of IMPORT_BATCH_SIZE rows at a
+    time. Each batch checks user names and emails against the database in
+    one query, hashes passwords on the bulk process pool and commits on its
+    own, so a failed row never blocks the rest. With ``dry_run`` nothing is
+    hashed or written.
+    """
+    started = time.monotonic()
+    report = {"dry_run": dry_run, "received": 0, "valid": 0, "created": 0, "subscriptions_created": 0, "failed": 0, "errors": []}
+
+    def fail(row_no, errors):
+        report["failed"] += 1
+        report["errors"].append({"row": row_no, "errors": errors})
+
+    if subscription_catalog.needs_check():
+        subscription_catalog.refresh()
+    plan_ids = set(subscription_catalog.by_id)
+    seen_names, seen_emails = set(), set()
+    records = _read_rows(fileobj, fmt)
+    db = SessionLocal()
+    try:
+        while True:
+            chunk = list(islice(records, settings.IMPORT_BATCH_SIZE))
+            if not chunk:
+                break
+            report["received"] += len(chunk)
+            rows = []
+            for row_no, record in chunk:
+                if isinstance(record, str):
+                    fail(row_no, [record])
+                    continue
+                row, errors = _validate(record, plan_ids)
+                if row is not None and not errors:
+                    if row.user_name in seen_names:
+                        errors.append("user_name: duplicate in file")
+                    if row.email in seen_emails:
+                        errors.append("email: duplicate in file")
+                if errors:
+                    fail(row_no, errors)
+                    continue
+                seen_names.add(row.user_name)
+                seen_emails.add(row.email)
+                rows.append((row_no, row))
+            if rows:
+                taken_names, taken_emails = _existing(db, rows)
+                fresh = []
+                for row_no, row in rows:
+                    if row.user_name in taken_names or row.email in taken_emails:
+                        fail(row_no, ["user_name or email already exists"])
+                    else:
+                        fresh.append((row_no, row))
+                rows = fresh
+            report["valid"] += len(rows)
+            if not rows or dry_run:
+                continue
+            hashes = passwords.hash_passwords_bulk([row.password for _, row in rows])
+            created, subscriptions = _load_batch(db, rows, hashes, added_by)
+            db.commit()
+            report["created"] += len(created)
+            report["subscriptions_created"] += subscriptions
+            for row_no, row in rows:
+                if row.email not in created:
+                    fail(row_no, ["user_name or email already exists"])
+    finally:
+        db.close()
+    elapsed = time.monotonic() - started
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["received"] / elapsed, 1) if elapsed else None
+    report["errors"].sort(key=lambda e: e["row"])
+    return report
@@ -0,0 +1,97 @@
+# Keyset (cursor) pagination and column projection for list endpoints
+import base64
+import json
+from datetime import date, datetime
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import func, select
+
+
+def encode_cursor(*values) -> str:
+    payload = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int = 1) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def parse_fields(fields: str | None, field_map: dict) -> list[str]:
+    """Validate a comma separated ``fields=`` parameter against ``field_map``."""
+    if not fields:
+        return list(field_map)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [n for n in names if n not in field_map]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def projection(field_map: dict, names: list[str], key_column) -> list:
+    """Labelled columns for the requested fields plus the keyset column.
+
+    ``field_map`` maps an output name to ``(column, transform)``.
+    """
+    columns = [field_map[name][0].label(name) for name in names]
+    columns.append(key_column.label("_cursor_key"))
+    return columns
+
+
+def count_statement(stmt):
+    return select(func.count()).select_from(stmt.order_by(None).subquery())
+
+
+def keyset(stmt, key_column, limit: int | None, after: str | None):
+    if after:
+        (last_key,) = decode_cursor(after)
+        if not isinstance(last_key, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(key_column > last_key)
+    stmt = stmt.order_by(key_column)
+    if limit:
+        # one extra row tells us whether there is a next page
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+
+def rows_to_items(rows, field_map: dict, names: list[str]) -> list[dict]:
+    # rows come from projection(): the requested fields in order, so zip the
+    # tuples straight into dicts and only revisit fields that have a transform
+    transforms = [(name, field_map[name][1]) for name in names if field_map[name][1] is not None]
+    items = [dict(zip(names, row)) for row in rows]
+    for name, transform in transforms:
+        for item in items:
+            value = item[name]
+            if value is not None:
+                item[name] = transform(value)
+    return items
+
+
+def build_page(rows, field_map: dict, names: list[str], limit: int | None):
+    has_more = limit is not None and len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+    items = rows_to_items(rows, field_map, names)
+    next_cursor = encode_cursor(rows[-1]._mapping["_cursor_key"]) if has_more else None
+    return items, next_cursor
+
+
+def set_page_headers(request: Request, response: Response, next_cursor: str | None, total: int | None = None):
+    """Expose paging metadata in headers so the list body keeps its shape."""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.include_query_params(after=next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+
+
+PAGE_HEADERS = ["X-Next-Cursor", "X-Total-Count", "Link"]
@@ -0,0 +1,133 @@
+# Password hashing on a dedicated, size-limited executor
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from app.config.config import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+# bulk imports hash on their own processes so logins keep their pool
+_bulk_executor = None
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _hashpw(pw_bytes: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(pw_bytes, bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _checkpw(pw_bytes: bytes, hashed: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(pw_bytes, hashed)
+    except Exception:
+        return False
+
+
+def _to_bytes(password: str) -> bytes:
+    # bcrypt has a 72-byte input limit; stored hashes were made from the
+    # first 72 bytes, so verification has to truncate the same way.
+    return password.encode("utf-8")[:72]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if settings.PASSWORD_HASH_EXECUTOR == "process":
+                    _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+                else:
+                    # bcrypt releases the GIL, so threads give real parallelism
+                    _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def _release(_future):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _submit(fn, *args):
+    """Queue work on the hashing pool, failing fast with 503 once the queue is full."""
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        _pending += 1
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _release(None)
+        raise
+    future.add_done_callback(_release)
+    return future
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hashpw, _to_bytes(password), settings.BCRYPT_ROUNDS))
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.wrap_future(_submit(_checkpw, _to_bytes(plain_password), hashed_password.encode("utf-8")))
+
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    return _submit(_checkpw, _to_bytes(plain_password), hashed_password.encode("utf-8")).result()
+
+
+def _get_bulk_executor():
+    global _bulk_executor
+    if _bulk_executor is None:
+        with _executor_lock:
+            if _bulk_executor is None:
+                _bulk_executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_IMPORT_WORKERS)
+    return _bulk_executor
+
+
+def hash_passwords_bulk(passwords: list[str]) -> list[str]:
+    """Hash many passwords in parallel on a dedicated process pool (blocking)."""
+    if not passwords:
+        return []
+    chunksize = max(1, len(passwords) // (settings.PASSWORD_IMPORT_WORKERS * 4))
+    return list(_get_bulk_executor().map(
+        _hashpw, [_to_bytes(p) for p in passwords], repeat(settings.BCRYPT_ROUNDS), chunksize=chunksize,
+    ))
+
+
+def shutdown():
+    global _executor, _bulk_executor
+    with _executor_lock:
+        for executor in (_executor, _bulk_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _executor = _bulk_executor = None
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash was made with a different cost than BCRYPT_ROUNDS."""
+    # bcrypt hashes look like $2b$12$<salt+hash>
+    parts = (hashed_password or "").split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return False
+    return int(parts[2]) != settings.BCRYPT_ROUNDS
+
+
+def stats():
+    with _pending_lock:
+        pending = _pending
+    return {
+        "executor": settings.PASSWORD_HASH_EXECUTOR,
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "queue_size": settings.PASSWORD_HASH_QUEUE_SIZE,
+        "pending": pending,
+    }
@@ -0,0 +1,56 @@
+# Fast JSON rendering: orjson when installed, stdlib json otherwise
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _default(value):
+    # same shapes jsonable_encoder produces, so switching encoders does not change bodies
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+else:
+    def dumps(content) -> bytes:
+        return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (datetime, date, UUID and Decimal handled natively)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_response(content, response: Response | None = None, status_code: int = 200) -> FastJSONResponse:
+    """Render ``content`` directly, skipping FastAPI's jsonable_encoder pass.
+
+    ``content`` must already be plain rows (dicts, lists, scalars, datetimes).
+    Headers set on the handler's injected ``response`` (ETag, paging
+    headers) are carried over.
+    """
+    out = FastJSONResponse(content, status_code=status_code)
+    if response is not None:
+        out.raw_headers.extend(h for h in response.raw_headers if h[0] not in (b"content-length", b"content-type"))
+    return out
@@ -0,0 +1,44 @@
+# Minimal in-process scheduler for periodic maintenance jobs
+import asyncio
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+_jobs = []
+_tasks = []
+
+
+def register_job(name: str, interval_seconds: float, func):
+    """Run ``func`` (a sync callable) every ``interval_seconds`` in the threadpool.
+
+    Every worker process runs its own copy of each job, so jobs must be
+    idempotent and safe to run concurrently.
+    """
+    _jobs.append((name, interval_seconds, func))
+
+
+async def _run_forever(name: str, interval_seconds: float, func):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(func)
+        except Exception:
+            logger.exception("Scheduled job %s failed", name)
+
+
+def start():
+    if not settings.SCHEDULER_ENABLED:
+        return
+    for name, interval_seconds, func in _jobs:
+        _tasks.append(asyncio.create_task(_run_forever(name, interval_seconds, func)))
+
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -0,0 +1,283 @@
+# Ranked fuzzy search over users, subscription plans and media names.
+#
+# On Postgres users and media are matched with pg_trgm (substring ILIKE plus
+# word similarity for typos), both served by the GIN trigram indexes on the
+# models. Other databases get a process-local trigram inverted index that is
+# polled and brought up to date from the tables. Plans are always searched in
+# the in-process subscription catalog. Both paths rank the same way: word
+# similarity, plus a bonus for prefix and substring matches.
+import heapq
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import case, func, literal, or_, select
+from starlette.concurrency import run_in_threadpool
+
+from app.config.config import settings
+from app.models import SessionLocal, engine
+from app.models.async_session import fetch_all
+from app.models.media import Media
+from app.models.user import User
+from app.services import signing
+from app.services.catalog import get_catalog
+
+SEARCH_TYPES = ("users", "plans", "media")
+
+# pg_trgm's default word_similarity_threshold, used by the <% operator
+MIN_SIMILARITY = 0.6
+PREFIX_BONUS = 1.0
+SUBSTRING_BONUS = 0.5
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def trigrams(text: str) -> set:
+    """Trigrams of each word, padded the way pg_trgm pads them."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _score(needle: str, query_grams: set, texts, grams) -> float | None:
+    best = 0.0
+    bonus = 0.0
+    for text, text_grams in zip(texts, grams):
+        if not text:
+            continue
+        if query_grams:
+            best = max(best, len(query_grams & text_grams) / len(query_grams))
+        if text.startswith(needle):
+            bonus = PREFIX_BONUS
+        elif needle in text:
+            bonus = max(bonus, SUBSTRING_BONUS)
+    if best < MIN_SIMILARITY and not bonus:
+        return None
+    return round(best + bonus, 4)
+
+
+def rank(query: str, values) -> float | None:
+    """Score ``values`` against ``query``; None when nothing matches."""
+    texts = [value.lower() if value else "" for value in values]
+    return _score(query.lower(), trigrams(query), texts, [trigrams(text) for text in texts])
+
+
+def _like_escape(query: str) -> str:
+    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class _Source:
+    """A searchable table: its key, the text columns to match and the columns returned."""
+
+    def __init__(self, name, model, key, fields, columns, live=()):
+        self.name = name
+        self.model = model
+        self.key = key
+        self.fields = fields
+        self.columns = columns
+        self.live = live
+
+
+USERS = _Source(
+    "users", User, User.user_id,
+    fields=(User.user_name, User.email, User.phone),
+    columns=(User.user_id, User.user_name, User.email, User.phone, User.role, User.active),
+)
+MEDIA = _Source(
+    "media", Media, Media.id,
+    fields=(Media.original_name,),
+    columns=(Media.id, Media.user_id, Media.original_name, Media.media_type, Media.upload_date, Media.stored_path),
+    live=(Media.is_deleted == False,),
+)
+SOURCES = {source.name: source for source in (USERS, MEDIA)}
+
+
+def _item(source: _Source, row, score: float) -> dict:
+    item = {column.key: row._mapping[column.key] for column in source.columns}
+    if source is MEDIA:
+        item["url"] = signing.media_url(item.pop("stored_path"))
+    item["rank"] = score
+    return item
+
+
+def _trigram_statement(source: _Source, query: str, limit: int):
+    """Postgres: substring or word-similarity match, each usable with a GIN trigram index."""
+    q = literal(query)
+    escaped = _like_escape(query)
+    prefix = or_(*(field.ilike(f"{escaped}%", escape="\\") for field in source.fields))
+    contains = [field.ilike(f"%{escaped}%", escape="\\") for field in source.fields]
+    similar = [q.op("<%")(field) for field in source.fields]
+    score = func.greatest(*(func.coalesce(func.word_similarity(q, field), 0) for field in source.fields)) + case(
+        (prefix, PREFIX_BONUS), (or_(*contains), SUBSTRING_BONUS), else_=0,
+    )
+    score = score.label("rank")
+    return (
+        select(*source.columns, score)
+        .where(*source.live, or_(*contains, *similar))
+        .order_by(score.desc(), source.key)
+        .limit(limit)
+    )
+
+
+class TrigramIndex:
+    """In-memory trigram inverted index over one source, for databases without pg_trgm.
+
+    ``refresh`` applies rows changed since the last refresh (by updated_at)
+    and rebuilds from scratch when rows disappeared outright, e.g. users
+    deleted with a hard DELETE.
+    """
+
+    def __init__(self, source: _Source):
+        self.source = source
+        self._lock = threading.Lock()
+        self.docs = {}
+        self.postings = defaultdict(set)
+        self.watermark = None
+        self.builds = 0
+        self.updates = 0
+        self._checked_at = 0.0
+
+    def needs_check(self) -> bool:
+        return self.watermark is None or time.monotonic() - self._checked_at >= settings.SEARCH_INDEX_POLL_SECONDS
+
+    def _put(self, key, row):
+        self._remove(key)
+        texts = tuple((row._mapping[field.key] or "").lower() for field in self.source.fields)
+        grams = tuple(trigrams(text) for text in texts)
+        self.docs[key] = (row, texts, grams)
+        for gram in set().union(*grams):
+            self.postings[gram].add(key)
+
+    def _remove(self, key):
+        old = self.docs.pop(key, None)
+        if old is None:
+            return
+        for gram in set().union(*old[2]):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def refresh(self, force: bool = False):
+        source = self.source
+        model = source.model
+        rebuild = force or self.watermark is None
+        db = SessionLocal()
+        try:
+            stmt = select(*source.columns, model.updated_at, *(c.label(f"_live_{i}") for i, c in enumerate(source.live)))
+            if not rebuild:
+                # >= so rows updated within the watermark's own second are not missed
+                stmt = stmt.where(model.updated_at >= self.watermark)
+            rows = db.execute(stmt).all()
+            live_count = db.execute(select(func.count()).select_from(model).where(*source.live)).scalar()
+        finally:
+            db.close()
+        with self._lock:
+            if rebuild:
+                self.docs.clear()
+                self.postings.clear()
+                self.builds += 1
+            else:
+                self.updates += 1
+            for row in rows:
+                key = row._mapping[source.key.key]
+                if all(row._mapping[f"_live_{i}"] for i in range(len(source.live))):
+                    self._put(key, row)
+                else:
+                    self._remove(key)
+                if row.updated_at is not None and (self.watermark is None or row.updated_at > self.watermark):
+                    self.watermark = row.updated_at
+            self._checked_at = time.monotonic()
+            stale = len(self.docs) != live_count
+        if stale and not rebuild:
+            self.refresh(force=True)
+
+    def _candidates(self, needle: str, query_grams: set):
+        # enough shared trigrams to reach MIN_SIMILARITY ...
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+        needed = MIN_SIMILARITY * len(query_grams)
+        candidates = {key for key, count in shared.items() if count >= needed}
+        # ... or every unpadded trigram of the query, which any substring match has
+        inner = sorted((self.postings.get(gram, set()) for gram in query_grams if " " not in gram), key=len)
+        if inner:
+            candidates.update(inner[0].intersection(*inner[1:]))
+        return candidates
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        needle = query.lower()
+        query_grams = trigrams(query)
+        with self._lock:
+            if any(" " not in gram for gram in query_grams):
+                candidates = self._candidates(needle, query_grams)
+            else:
+                # no word of three letters or more: substring matches can only be found by a scan
+                candidates = self.docs.keys()
+            scored = []
+            for key in candidates:
+                row, texts, grams = self.docs[key]
+                score = _score(needle, query_grams, texts, grams)
+                if score is not None:
+                    scored.append((score, -key, row))
+        best = heapq.nlargest(limit, scored, key=lambda hit: (hit[0], hit[1]))
+        return [_item(self.source, row, score) for score, _, row in best]
+
+    def stats(self):
+        with self._lock:
+            return {"docs": len(self.docs), "trigrams": len(self.postings), "builds": self.builds, "updates": self.updates}
+
+
+use_pg_trgm = engine.dialect.name == "postgresql"
+indexes = {} if use_pg_trgm else {name: TrigramIndex(source) for name, source in SOURCES.items()}
+
+
+async def _search_source(db, source: _Source, query: str, limit: int) -> list[dict]:
+    if use_pg_trgm:
+        rows = await fetch_all(db, _trigram_statement(source, query, limit))
+        return [_item(source, row, round(float(row.rank), 4)) for row in rows]
+    index = indexes[source.name]
+    if index.needs_check():
+        await run_in_threadpool(index.refresh)
+    return await run_in_threadpool(index.search, query, limit)
+
+
+async def _search_plans(query: str, limit: int) -> list[dict]:
+    catalog = await get_catalog()
+    scored = []
+    for plan in catalog.items:
+        score = rank(query, [plan["subscription_name"], plan["description"]])
+        if score is not None:
+            scored.append((score, -plan["id"], plan))
+    best = heapq.nlargest(limit, scored, key=lambda hit: (hit[0], hit[1]))
+    return [
+        {
+            "id": plan["id"],
+            "subscription_name": plan["subscription_name"],
+            "description": plan["description"],
+            "price": plan["price"],
+            "active": plan["active"],
+            "rank": score,
+        }
+        for score, _, plan in best
+    ]
+
+
+async def search(db, query: str, types, limit: int) -> dict:
+    """Best ``limit`` matches per type, highest rank first."""
+    results = {}
+    for name in types:
+        if name == "plans":
+            results[name] = await _search_plans(query, limit)
+        else:
+            results[name] = await _search_source(db, SOURCES[name], query, limit)
+    return results
+
+
+def stats() -> dict:
+    if use_pg_trgm:
+        return {"backend": "pg_trgm"}
+    return {"backend": "memory", **{name: index.stats() for name, index in indexes.items()}}
@@ -0,0 +1,74 @@
+# HMAC-signed, expiring media URLs that the file route verifies without a database hit
+import base64
+import hashlib
+import hmac
+import math
+import time
+from functools import lru_cache
+from pathlib import PurePosixPath
+from urllib.parse import quote, urlencode
+
+from app.config.config import settings
+
+URL_PREFIX = "/uploads"
+
+
+@lru_cache(maxsize=1)
+def keyring() -> tuple[str, dict[str, bytes]]:
+    """(signing kid, {kid: secret}) parsed from MEDIA_URL_KEYS."""
+    if not settings.MEDIA_URL_KEYS:
+        derived = hmac.new(settings.SECRET_KEY.encode("utf-8"), b"media-urls", hashlib.sha256).digest()
+        return "0", {"0": derived}
+    keys = {}
+    for pair in settings.MEDIA_URL_KEYS.split(","):
+        kid, sep, secret = pair.strip().partition(":")
+        if not sep or not kid or not secret:
+            raise ValueError("MEDIA_URL_KEYS entries must look like kid:secret")
+        keys[kid] = secret.encode("utf-8")
+    return next(iter(keys)), keys
+
+
+def _signature(key: bytes, kid: str, expires: int, path: str) -> str:
+    mac = hmac.new(key, f"{kid}\n{expires}\n{path}".encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac[:16]).decode("ascii").rstrip("=")
+
+
+def expiry_bucket(now: float | None = None) -> int:
+    """Expiry timestamp shared by every URL signed in the current step.
+
+    It is always at least MEDIA_URL_TTL_SECONDS away, and it changes only once
+    per MEDIA_URL_EXPIRY_STEP_SECONDS, so list ETags stay stable in between.
+    """
+    now = time.time() if now is None else now
+    step = max(1, settings.MEDIA_URL_EXPIRY_STEP_SECONDS)
+    return int(math.ceil((now + settings.MEDIA_URL_TTL_SECONDS) / step) * step)
+
+
+def sign(path: str, expires: int | None = None) -> dict[str, str]:
+    kid, keys = keyring()
+    expires = expiry_bucket() if expires is None else expires
+    return {"exp": str(expires), "kid": kid, "sig": _signature(keys[kid], kid, expires, path)}
+
+
+def media_url(stored_path: str, expires: int | None = None) -> str:
+    """Public, signed URL for a file stored under UPLOADS_DIR."""
+    path = PurePosixPath(stored_path).as_posix()
+    return f"{URL_PREFIX}/{quote(path)}?{urlencode(sign(path, expires))}"
+
+
+def verify(path: str, exp: str | None, kid: str | None, sig: str | None, now: float | None = None) -> int | None:
+    """Return the expiry timestamp if the signature is valid and current, else None."""
+    if not exp or not kid or not sig:
+        return None
+    key = keyring()[1].get(kid)
+    if key is None:
+        return None
+    try:
+        expires = int(exp)
+    except ValueError:
+        return None
+    if expires < (time.time() if now is None else now):
+        return None
+    if not hmac.compare_digest(_signature(key, kid, expires, path), sig):
+        return None
+    return expires
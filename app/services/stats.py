@@ -0,0 +1,320 @@
+# Dashboard aggregates: summary tables kept current by deltas, a reconcile job and the /stats reads
+import logging
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import case, delete, func, literal, or_, select, true, union_all
+
+from app.models import SessionLocal, dialect_insert
+from app.models.async_session import fetch_all, fetch_first
+from app.models.blob import Blob
+from app.models.media import Media
+from app.models.stats import DailyUploadStats, PlanStats, StatsCounter, UserStats
+from app.models.user_subscription import ACTIVE, UserSubscription
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SUBSCRIBERS = "active_subscribers"
+# lock row for the reconcile job; value is the unix time of the last full run
+RECONCILED = "reconciled"
+
+
+def _add(db, model, key: str, deltas: dict, columns: tuple) -> list:
+    """Add ``{key_value: [delta, ...]}`` to ``columns``, inserting missing rows.
+
+    Returns ``(key_value, *new_values)`` per row touched. Keys are applied
+    in sorted order so concurrent writers lock rows in the same order.
+    """
+    values = [
+        {key: k, **dict(zip(columns, d))}
+        for k, d in sorted(deltas.items())
+        if any(d)
+    ]
+    if not values:
+        return []
+    stmt = dialect_insert(db, model).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in columns},
+    ).returning(getattr(model, key), *(getattr(model, c) for c in columns))
+    return db.execute(stmt).all()
+
+
+def _blob_sizes(db, hashes) -> dict:
+    hashes = {h for h in hashes if h}
+    if not hashes:
+        return {}
+    return dict(db.execute(select(Blob.sha256, Blob.size).where(Blob.sha256.in_(hashes))).all())
+
+
+def _media_delta(db, rows, sign: int):
+    rows = list(rows)
+    sizes = _blob_sizes(db, (blob_hash for _, _, blob_hash in rows))
+    users = defaultdict(lambda: [0, 0])
+    days = defaultdict(lambda: [0, 0])
+    for user_id, upload_date, blob_hash in rows:
+        size = sizes.get(blob_hash, 0)
+        for bucket in (users[user_id], days[upload_date]):
+            bucket[0] += sign
+            bucket[1] += sign * size
+    _add(db, UserStats, "user_id", users, ("media_count", "storage_bytes"))
+    _add(db, DailyUploadStats, "upload_date", days, ("uploads", "bytes"))
+
+
+def media_added(db, rows):
+    """Count new media ``(user_id, upload_date, blob_hash)`` in the caller's transaction.
+
+    Call it last, just before commit, to hold the summary row locks briefly.
+    """
+    _media_delta(db, rows, 1)
+
+
+def media_removed(db, rows):
+    """Uncount media ``(user_id, upload_date, blob_hash)``; call before the blob is released."""
+    _media_delta(db, rows, -1)
+
+
+def subscription_state(sub) -> tuple | None:
+    """What a user_subscriptions row contributes: ``(user_id, subscription_id, active)``, None once deleted."""
+    if sub.is_deleted:
+        return None
+    return sub.user_id, sub.subscription_id, sub.subscription_status == ACTIVE
+
+
+def subscriptions_changed(db, removed=(), added=()):
+    """Apply subscription states leaving (``removed``) and entering (``added``) the aggregates."""
+    plans = defaultdict(lambda: [0, 0])
+    users = defaultdict(lambda: [0])
+    for sign, states in ((-1, removed), (1, added)):
+        for state in states:
+            if state is None:
+                continue
+            user_id, subscription_id, active = state
+            plans[subscription_id][0] += sign
+            if active:
+                plans[subscription_id][1] += sign
+                users[user_id][0] += sign
+    _add(db, PlanStats, "subscription_id", plans, ("subscriptions", "active_subscriptions"))
+    # a user is an active subscriber while at least one of their subscriptions is active;
+    # the row lock on stats_users orders the 0 <-> 1 transitions per user
+    change = 0
+    for user_id, active_now in _add(db, UserStats, "user_id", users, ("active_subscriptions",)):
+        before = active_now - users[user_id][0]
+        change += (active_now > 0) - (before > 0)
+    _add(db, StatsCounter, "name", {ACTIVE_SUBSCRIBERS: [change]}, ("value",))
+
+
+# Aggregates computed from the base tables: the reconcile job writes them, ?verify compares against them
+
+def _live_media():
+    return (
+        select(Media.user_id, Media.upload_date, func.coalesce(Blob.size, 0).label("size"))
+        .outerjoin(Blob, Blob.sha256 == Media.blob_hash)
+        .where(Media.is_deleted == False)
+        .subquery()
+    )
+
+
+def _plan_aggregate():
+    return (
+        select(
+            UserSubscription.subscription_id.label("subscription_id"),
+            func.count().label("subscriptions"),
+            func.sum(case((UserSubscription.subscription_status == ACTIVE, 1), else_=0)).label("active_subscriptions"),
+        )
+        .where(UserSubscription.is_deleted == False)
+        .group_by(UserSubscription.subscription_id)
+    )
+
+
+def _day_aggregate():
+    media = _live_media()
+    return (
+        select(
+            media.c.upload_date.label("upload_date"),
+            func.count().label("uploads"),
+            func.sum(media.c.size).label("bytes"),
+        )
+        .group_by(media.c.upload_date)
+    )
+
+
+def _user_aggregate():
+    media = _live_media()
+    parts = union_all(
+        select(
+            media.c.user_id, literal(0).label("active_subscriptions"),
+            literal(1).label("media_count"), media.c.size.label("storage_bytes"),
+        ),
+        select(
+            UserSubscription.user_id, literal(1), literal(0), literal(0),
+        ).where(UserSubscription.is_deleted == False, UserSubscription.subscription_status == ACTIVE),
+    ).subquery()
+    return (
+        select(
+            parts.c.user_id.label("user_id"),
+            func.sum(parts.c.active_subscriptions).label("active_subscriptions"),
+            func.sum(parts.c.media_count).label("media_count"),
+            func.sum(parts.c.storage_bytes).label("storage_bytes"),
+        )
+        .group_by(parts.c.user_id)
+    )
+
+
+def _active_subscribers_query():
+    return (
+        select(func.count(func.distinct(UserSubscription.user_id)))
+        .where(UserSubscription.is_deleted == False, UserSubscription.subscription_status == ACTIVE)
+    )
+
+
+def _replace(db, model, key: str, columns: tuple, aggregate) -> int:
+    """Make ``model`` match ``aggregate``; returns how many rows had drifted."""
+    source = aggregate.subquery()
+    stmt = dialect_insert(db, model).from_select(
+        [key, *columns],
+        # the WHERE keeps SQLite from reading ON CONFLICT as part of the SELECT
+        select(source.c[key], *(source.c[c] for c in columns)).where(true()),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={c: getattr(stmt.excluded, c) for c in columns},
+        where=or_(*(getattr(model, c).is_distinct_from(getattr(stmt.excluded, c)) for c in columns)),
+    ).returning(getattr(model, key))
+    drifted = len(db.execute(stmt).all())
+    stale = db.execute(delete(model).where(getattr(model, key).not_in(select(source.c[key]))))
+    return drifted + stale.rowcount
+
+
+def _claim_reconcile(db) -> bool:
+    db.execute(dialect_insert(db, StatsCounter).values(name=RECONCILED, value=0).on_conflict_do_nothing())
+    db.commit()
+    claimed = db.execute(
+        select(StatsCounter.name).where(StatsCounter.name == RECONCILED).with_for_update(skip_locked=True)
+    ).first()
+    return claimed is not None
+
+
+def reconcile_stats() -> dict | None:
+    """Recompute every summary table from the base tables and fix any drift.
+
+    Deltas cover the API's write paths; this catches everything else (SQL run
+    by hand, migrate_blobs.py, deleted plans or users). One worker runs it at
+    a time, the others skip. A write that commits while a table is being
+    rewritten can be off until the next run.
+    """
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        if not _claim_reconcile(db):
+            return None
+        report = {
+            "plans": _replace(db, PlanStats, "subscription_id", ("subscriptions", "active_subscriptions"), _plan_aggregate()),
+            "days": _replace(db, DailyUploadStats, "upload_date", ("uploads", "bytes"), _day_aggregate()),
+            "users": _replace(db, UserStats, "user_id", ("active_subscriptions", "media_count", "storage_bytes"), _user_aggregate()),
+        }
+        actual = db.execute(_active_subscribers_query()).scalar()
+        counter = db.get(StatsCounter, ACTIVE_SUBSCRIBERS)
+        report["active_subscribers"] = int((counter.value if counter else 0) != actual)
+        db.execute(
+            dialect_insert(db, StatsCounter)
+            .values(name=ACTIVE_SUBSCRIBERS, value=actual)
+            .on_conflict_do_update(index_elements=["name"], set_={"value": actual, "updated_at": func.now()})
+        )
+        db.execute(
+            StatsCounter.__table__.update()
+            .where(StatsCounter.name == RECONCILED)
+            .values(value=int(time.time()), updated_at=func.now())
+        )
+        db.commit()
+    finally:
+        db.close()
+    report["seconds"] = round(time.monotonic() - started, 3)
+    drift = sum(v for k, v in report.items() if k != "seconds")
+    if drift:
+        logger.warning("Stats reconcile corrected %d drifted rows: %s", drift, report)
+    return report
+
+
+async def load(db, days: int, top: int, today: date | None = None) -> dict:
+    """Read the dashboard figures from the summary tables; every query is a key lookup or a short range."""
+    today = date.today() if today is None else today
+    first_day = today - timedelta(days=days - 1)
+    counters = {r.name: r for r in await fetch_all(db, select(StatsCounter.name, StatsCounter.value, StatsCounter.updated_at))}
+    plans = await fetch_all(db, select(PlanStats.subscription_id, PlanStats.subscriptions, PlanStats.active_subscriptions))
+    daily = {
+        r.upload_date: r for r in await fetch_all(db, select(
+            DailyUploadStats.upload_date, DailyUploadStats.uploads, DailyUploadStats.bytes,
+        ).where(DailyUploadStats.upload_date.between(first_day, today)))
+    }
+    totals = await fetch_first(db, select(
+        func.coalesce(func.sum(DailyUploadStats.uploads), 0), func.coalesce(func.sum(DailyUploadStats.bytes), 0),
+    ))
+    top_users = await fetch_all(db, select(
+        UserStats.user_id, UserStats.media_count, UserStats.storage_bytes,
+    ).where(UserStats.storage_bytes > 0).order_by(UserStats.storage_bytes.desc(), UserStats.user_id).limit(top))
+    active = counters.get(ACTIVE_SUBSCRIBERS)
+    reconciled = counters.get(RECONCILED)
+    return {
+        "active_subscribers": active.value if active else 0,
+        "plans": [
+            {"subscription_id": p.subscription_id, "subscriptions": p.subscriptions, "active_subscriptions": p.active_subscriptions}
+            for p in sorted(plans, key=lambda p: p.subscription_id)
+            if p.subscriptions or p.active_subscriptions
+        ],
+        "uploads_per_day": [
+            {
+                "date": day,
+                "uploads": daily[day].uploads if day in daily else 0,
+                "bytes": daily[day].bytes if day in daily else 0,
+            }
+            for day in (first_day + timedelta(days=i) for i in range(days))
+        ],
+        "media_total": totals[0],
+        "storage_bytes_total": totals[1],
+        "top_storage": [
+            {"user_id": u.user_id, "media_count": u.media_count, "storage_bytes": u.storage_bytes} for u in top_users
+        ],
+        "reconciled_at": reconciled.updated_at if reconciled and reconciled.value else None,
+    }
+
+
+async def verify(db, report: dict) -> dict:
+    """Recompute ``report``'s figures from the base tables (full scans) and list any mismatch."""
+    differences = []
+
+    def check(metric, key, stored, actual):
+        if stored != actual:
+            differences.append({"metric": metric, "key": key, "stored": stored, "actual": actual})
+
+    check("active_subscribers", None, report["active_subscribers"], (await fetch_first(db, _active_subscribers_query()))[0])
+    plans = {r.subscription_id: r for r in await fetch_all(db, _plan_aggregate())}
+    stored_plans = {p["subscription_id"]: p for p in report["plans"]}
+    for plan_id in sorted(plans.keys() | stored_plans.keys()):
+        for field in ("subscriptions", "active_subscriptions"):
+            actual = getattr(plans[plan_id], field) if plan_id in plans else 0
+            check(f"plans.{field}", plan_id, stored_plans.get(plan_id, {}).get(field, 0), actual)
+    window = report["uploads_per_day"]
+    if window:
+        source = _day_aggregate().subquery()
+        days = {r.upload_date: r for r in await fetch_all(db, select(source).where(
+            source.c.upload_date.between(window[0]["date"], window[-1]["date"])
+        ))}
+        for entry in window:
+            actual = days.get(entry["date"])
+            check("uploads_per_day.uploads", entry["date"], entry["uploads"], actual.uploads if actual else 0)
+            check("uploads_per_day.bytes", entry["date"], entry["bytes"], actual.bytes if actual else 0)
+    media = _live_media()
+    count, size = await fetch_first(db, select(func.count(), func.coalesce(func.sum(media.c.size), 0)))
+    check("media_total", None, report["media_total"], count)
+    check("storage_bytes_total", None, report["storage_bytes_total"], size)
+    listed = [u["user_id"] for u in report["top_storage"]]
+    if listed:
+        source = _user_aggregate().subquery()
+        users = {r.user_id: r for r in await fetch_all(db, select(source).where(source.c.user_id.in_(listed)))}
+        for entry in report["top_storage"]:
+            actual = users.get(entry["user_id"])
+            check("top_storage.media_count", entry["user_id"], entry["media_count"], actual.media_count if actual else 0)
+            check("top_storage.storage_bytes", entry["user_id"], entry["storage_bytes"], actual.storage_bytes if actual else 0)
+    return {"matches": not differences, "differences": differences}
@@ -0,0 +1,120 @@
+# Streaming file storage helpers for uploaded media
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile, status
+
+from app.config.config import settings
+
+
+@dataclass
+class StoredFile:
+    path: Path
+    size: int
+    sha256: str
+
+
+class UploadBudget:
+    """Tracks how many bytes a single request may still write to disk."""
+
+    def __init__(self, max_request_bytes: int | None = None, max_file_bytes: int | None = None):
+        self.remaining = max_request_bytes if max_request_bytes is not None else settings.UPLOAD_MAX_REQUEST_BYTES
+        self.max_file_bytes = max_file_bytes if max_file_bytes is not None else settings.UPLOAD_MAX_FILE_BYTES
+
+    def consume(self, n: int, file_size: int, filename: str):
+        if file_size > self.max_file_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File '{filename}' exceeds the {self.max_file_bytes} byte limit",
+            )
+        if n > self.remaining:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Upload exceeds the per-request size limit",
+            )
+        self.remaining -= n
+
+
+def upload_root() -> Path:
+    return Path.cwd() / settings.UPLOADS_DIR
+
+
+def ensure_dir(path: Path):
+    if not path.exists():
+        path.mkdir(parents=True, exist_ok=True)
+
+
+def safe_filename(filename: str) -> str:
+    return filename.replace("..", "").replace("/", "_")
+
+
+def timestamped_name(filename: str) -> str:
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+    return f"{timestamp}_{safe_filename(filename)}"
+
+
+def write_chunks(chunks, dest: Path, budget: UploadBudget | None = None, filename: str = "") -> StoredFile:
+    """Write an iterable of byte chunks to ``dest``.
+
+    Data is written to a temporary file in the destination directory and
+    atomically renamed into place once complete, so readers never observe a
+    partially written file. The SHA-256 digest is computed while copying.
+    """
+    ensure_dir(dest.parent)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in chunks:
+                size += len(chunk)
+                if budget is not None:
+                    budget.consume(len(chunk), size, filename or dest.name)
+                digest.update(chunk)
+                out.write(chunk)
+        # mkstemp creates files as 0600; uploads are served to other readers
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    return StoredFile(path=dest, size=size, sha256=digest.hexdigest())
+
+
+def iter_file(src, chunk_size: int | None = None):
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    return iter(lambda: src.read(chunk_size), b"")
+
+
+def copy_stream(src, dest: Path, budget: UploadBudget | None = None, filename: str = "") -> StoredFile:
+    """Copy a binary file object to ``dest`` in bounded chunks."""
+    return write_chunks(iter_file(src), dest, budget=budget, filename=filename)
+
+
+def save_upload(upload: UploadFile, dest: Path, budget: UploadBudget | None = None) -> StoredFile:
+    return copy_stream(upload.file, dest, budget=budget, filename=upload.filename or "")
+
+
+def remove_files(paths):
+    """Best-effort cleanup of files written before a failed request."""
+    for path in paths:
+        try:
+            Path(path).unlink()
+        except OSError:
+            pass
+
+
+def media_type_for(content_type: str | None) -> str:
+    ctype = (content_type or "").lower()
+    if ctype.startswith("image"):
+        return "image"
+    if ctype.startswith("video"):
+        return "video"
+    return "file"
@@ -0,0 +1,150 @@
+# Subscription status upkeep (bulk expiry) and the cached per-user entitlement check
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from app.config.config import settings
+from app.models import SessionLocal
+from app.models.async_session import fetch_all
+from app.models.user_subscription import ACTIVE, EXPIRED, UserSubscription
+from app.services import stats
+from app.services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# user_id -> ((subscription_id, start_datetime, end_date), ...) of live Active rows not yet ended
+entitlement_cache = TTLCache(maxsize=settings.ENTITLEMENT_CACHE_SIZE, ttl=settings.ENTITLEMENT_CACHE_TTL_SECONDS)
+
+_expiry_listeners = []
+
+
+def on_expiry(func):
+    """Register ``func(rows)``, called with the rows of each committed expiry batch.
+
+    Each row has id, user_id, subscription_id and end_date. Usable as a decorator.
+    """
+    _expiry_listeners.append(func)
+    return func
+
+
+def _emit_expired(rows):
+    for listener in _expiry_listeners:
+        try:
+            listener(rows)
+        except Exception:
+            logger.exception("Subscription expiry listener %r failed", listener)
+
+
+def invalidate_entitlement(*user_ids):
+    for user_id in user_ids:
+        entitlement_cache.pop(user_id)
+
+
+@on_expiry
+def _invalidate_expired(rows):
+    invalidate_entitlement(*{row.user_id for row in rows})
+
+
+def _expire_batch(db, now: datetime) -> list:
+    due = (
+        select(UserSubscription.id)
+        .where(
+            UserSubscription.subscription_status == ACTIVE,
+            UserSubscription.is_deleted == False,
+            UserSubscription.end_date <= now,
+        )
+        .order_by(UserSubscription.end_date)
+        .limit(settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(UserSubscription)
+        .where(UserSubscription.id.in_(due), UserSubscription.subscription_status == ACTIVE)
+        .values(subscription_status=EXPIRED, updated_at=func.now())
+        .returning(UserSubscription.id, UserSubscription.user_id, UserSubscription.subscription_id, UserSubscription.end_date)
+        .execution_options(synchronize_session=False)
+    ).all()
+    stats.subscriptions_changed(
+        db,
+        removed=[(r.user_id, r.subscription_id, True) for r in rows],
+        added=[(r.user_id, r.subscription_id, False) for r in rows],
+    )
+    db.commit()
+    return rows
+
+
+def expire_subscriptions(max_seconds: float | None = None) -> dict:
+    """Flip live Active subscriptions whose end_date has passed to Expired.
+
+    Works in batches of SUBSCRIPTION_EXPIRY_BATCH_SIZE off the partial
+    end_date index, one transaction each, and stops after
+    SUBSCRIPTION_EXPIRY_MAX_SECONDS; the next run picks up the rest. Rows are
+    claimed with SKIP LOCKED, so every worker process can run this job at the
+    same time. Listeners registered with ``on_expiry`` see each batch after it
+    commits.
+    """
+    max_seconds = settings.SUBSCRIPTION_EXPIRY_MAX_SECONDS if max_seconds is None else max_seconds
+    started = time.monotonic()
+    now = datetime.utcnow()
+    expired = batches = 0
+    finished = False
+    db = SessionLocal()
+    try:
+        while True:
+            rows = _expire_batch(db, now)
+            if not rows:
+                finished = True
+                break
+            batches += 1
+            expired += len(rows)
+            _emit_expired(rows)
+            if len(rows) < settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE:
+                finished = True
+                break
+            if time.monotonic() - started >= max_seconds:
+                break
+    finally:
+        db.close()
+    elapsed = time.monotonic() - started
+    if expired:
+        logger.info("Expired %d subscriptions in %d batches (%.1fs)", expired, batches, elapsed)
+    return {
+        "expired": expired,
+        "batches": batches,
+        "finished": finished,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(expired / elapsed, 1) if elapsed else None,
+    }
+
+
+async def load_periods(db, user_id: int) -> tuple:
+    """A user's current and upcoming subscription periods, from the cache when possible."""
+    periods = entitlement_cache.get(user_id)
+    if periods is None:
+        rows = await fetch_all(db, select(
+            UserSubscription.subscription_id, UserSubscription.start_datetime, UserSubscription.end_date,
+        ).where(
+            UserSubscription.user_id == user_id,
+            UserSubscription.is_deleted == False,
+            UserSubscription.subscription_status == ACTIVE,
+            UserSubscription.end_date > datetime.utcnow(),
+        ))
+        periods = tuple((r.subscription_id, r.start_datetime, r.end_date) for r in rows)
+        entitlement_cache.set(user_id, periods)
+    return periods
+
+
+def entitlement(periods, now: datetime | None = None) -> dict:
+    """Whether any period covers ``now``, judged by the dates rather than the stored status.
+
+    Periods that start or end while cached take effect on time.
+    """
+    now = datetime.utcnow() if now is None else now
+    current = [p for p in periods if p[1] <= now < p[2]]
+    return {
+        "active": bool(current),
+        "subscription_ids": sorted({p[0] for p in current}),
+        "expires_at": max(p[2] for p in current) if current else None,
+    }
@@ -0,0 +1,107 @@
+# JWT issuing/verification and the cached user lookup used for authentication
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.config.config import settings
+from app.models.user import User
+from app.services.cache import TTLCache
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    user_id: int
+    user_name: str
+    email: str
+    role: str
+    active: bool
+    token_version: int
+
+
+user_cache = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+
+def create_access_token(user: User) -> str:
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user.user_id),
+        "user_id": str(user.user_id),
+        "role": user.role,
+        "ver": user.token_version or 0,
+        "iat": now,
+        "exp": now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+
+def decode_access_token(token: str) -> dict:
+    try:
+        claims = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.JWT_ALGORITHM],
+            options={"require": ["sub", "exp", "iat", "ver"]},
+        )
+        claims["sub"] = int(claims["sub"])
+        claims["ver"] = int(claims["ver"])
+    except (jwt.PyJWTError, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+    return claims
+
+
+def cache_user(user: User) -> CachedUser:
+    cached = CachedUser(
+        user_id=user.user_id,
+        user_name=user.user_name,
+        email=user.email,
+        role=user.role,
+        active=user.active,
+        token_version=user.token_version or 0,
+    )
+    user_cache.set(user.user_id, cached)
+    return cached
+
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+
+def get_token_user(db: Session, claims: dict) -> CachedUser | None:
+    """Resolve the user for verified token claims, hitting the DB only on a cache miss.
+
+    A token newer than the cached version (e.g. after a login handled by
+    another worker) forces a reload; an older one has been revoked.
+    """
+    user_id = claims["sub"]
+    cached = user_cache.get(user_id)
+    if cached is None or claims["ver"] > cached.token_version:
+        user = db.query(User).filter(User.user_id == user_id).first()
+        if not user:
+            invalidate_user(user_id)
+            return None
+        cached = cache_user(user)
+    if cached.token_version != claims["ver"]:
+        return None
+    return cached
+
+
+def revoke_tokens(db: Session, user: User) -> int:
+    """Invalidate every token issued so far for ``user``; the caller commits.
+
+    The bump is a single UPDATE, so concurrent logins each get their own
+    version (the row lock orders them) and none of them reuses an older one.
+    """
+    version = db.execute(
+        update(User).where(User.user_id == user.user_id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    set_committed_value(user, "token_version", version)
+    invalidate_user(user.user_id)
+    return version
@@ -0,0 +1,145 @@
+# Resumable chunked uploads: chunk storage, assembly and expiry
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import update
+
+from app.config.config import settings
+from app.models import SessionLocal
+from app.models.upload_session import UploadSession
+from app.services import blobs
+from app.services.blobs import StagedBlob
+from app.services.storage import ensure_dir, iter_file
+
+logger = logging.getLogger(__name__)
+
+
+def sessions_root() -> Path:
+    return Path.cwd() / settings.UPLOAD_SESSIONS_DIR
+
+
+def session_dir(session_id: str) -> Path:
+    return sessions_root() / session_id
+
+
+def chunk_path(session_id: str, index: int) -> Path:
+    return session_dir(session_id) / f"{index:06d}.part"
+
+
+def expected_chunk_size(session: UploadSession, index: int) -> int:
+    if index < session.total_chunks - 1:
+        return session.chunk_size
+    return session.total_size - session.chunk_size * (session.total_chunks - 1)
+
+
+def new_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+
+
+def received_chunks(session: UploadSession) -> list[int]:
+    """Indices of chunks that are fully present on disk."""
+    received = []
+    directory = session_dir(session.id)
+    if not directory.exists():
+        return received
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.endswith(".part") or entry.name.startswith("."):
+                continue
+            try:
+                index = int(entry.name[:-5])
+            except ValueError:
+                continue
+            if 0 <= index < session.total_chunks and entry.stat().st_size == expected_chunk_size(session, index):
+                received.append(index)
+    received.sort()
+    return received
+
+
+def refresh_expiry(db, session: UploadSession):
+    """Push an active session's expiry out again, at most once per half TTL."""
+    if session.expires_at - datetime.utcnow() > timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS / 2):
+        return
+    db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session.id, UploadSession.status != "completed")
+        .values(expires_at=new_expiry())
+    )
+    db.commit()
+
+
+class ChunkWriter:
+    """Writes one chunk to a temp file in the session directory as it arrives.
+
+    ``commit`` renames it into place, so a re-sent index replaces the old part
+    atomically and a dropped request never leaves a short part behind.
+    Blocking calls; run them in the threadpool.
+    """
+
+    def __init__(self, session: UploadSession, index: int):
+        self.dest = chunk_path(session.id, index)
+        ensure_dir(self.dest.parent)
+        fd, self.tmp_name = tempfile.mkstemp(dir=self.dest.parent, prefix=".chunk-", suffix=".part")
+        self.out = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self.out.write(data)
+
+    def commit(self):
+        self.out.close()
+        os.replace(self.tmp_name, self.dest)
+
+    def discard(self):
+        self.out.close()
+        try:
+            os.unlink(self.tmp_name)
+        except OSError:
+            pass
+
+
+def _iter_parts(session: UploadSession):
+    for index in range(session.total_chunks):
+        with chunk_path(session.id, index).open("rb") as part:
+            yield from iter_file(part)
+
+
+def assemble(session: UploadSession) -> StagedBlob:
+    return blobs.stage(_iter_parts(session), session.original_name)
+
+
+def remove_session_files(session_id: str):
+    shutil.rmtree(session_dir(session_id), ignore_errors=True)
+
+
+def purge_expired_sessions():
+    """Delete expired sessions and any chunk directories without an unfinished session row.
+
+    Completed sessions are kept until their own expiry so a retried complete
+    call still returns the media row.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        expired = db.query(UploadSession).filter(UploadSession.expires_at < now).all()
+        for s in expired:
+            remove_session_files(s.id)
+            db.delete(s)
+        db.commit()
+        root = sessions_root()
+        if not root.exists():
+            return
+        with os.scandir(root) as it:
+            names = [entry.name for entry in it if entry.is_dir()]
+        if names:
+            known = {row[0] for row in db.query(UploadSession.id).filter(UploadSession.id.in_(names), UploadSession.status != "completed")}
+            for name in names:
+                if name not in known:
+                    remove_session_files(name)
+        if expired:
+            logger.info("Purged %d expired upload sessions", len(expired))
+    finally:
+        db.close()
@@ -0,0 +1,11 @@
+import sys
+from app.services.archive import archive_expired_media
+
+if __name__ == "__main__":
+    # --dry-run only reports what would move to the archive tier
+    report = archive_expired_media(dry_run="--dry-run" in sys.argv, max_seconds=float("inf"))
+    if report is None:
+        print("Archiving is disabled (ARCHIVE_ENABLED) or another run holds the lock")
+    else:
+        for key, value in report.items():
+            print(f"{key}: {value}")
@@ -0,0 +1,72 @@
+import argparse
+import time
+from concurrent.futures import as_completed
+from sqlalchemy import exists, or_, select
+from app.config.config import settings
+from app.models import SessionLocal
+from app.models.blob import Blob
+from app.models.blob_variant import BlobVariant
+from app.models.media import Media
+from app.models.advertisement import Advertisement
+from app.services import derivatives
+
+def _pending_images(db, after, limit):
+    """Image blobs still referenced by a live row and without variants, in hash order."""
+    used_by_media = exists().where(Media.blob_hash == Blob.sha256, Media.media_type == "image", Media.is_deleted == False)
+    used_by_ads = exists().where(Advertisement.blob_hash == Blob.sha256, Advertisement.is_deleted == False)
+    has_variants = exists().where(BlobVariant.blob_hash == Blob.sha256)
+    return db.execute(
+        select(Blob.sha256, Blob.stored_path, Blob.size)
+        .where(Blob.sha256 > after, or_(used_by_media, used_by_ads), ~has_variants)
+        .order_by(Blob.sha256)
+        .limit(limit)
+    ).all()
+
+def backfill(batch_size=200):
+    """Render missing variants for blobs created before the pipeline existed.
+
+    Uploads that predate the blob store are picked up after migrate_blobs.py
+    has moved them onto blobs. Prints throughput per batch and overall.
+    """
+    db = SessionLocal()
+    done = failed = source_bytes = 0
+    started = time.perf_counter()
+    after = ""
+    try:
+        while True:
+            batch = _pending_images(db, after, batch_size)
+            if not batch:
+                break
+            after = batch[-1].sha256
+            batch_started = time.perf_counter()
+            futures = {derivatives.submit(b.stored_path, b.sha256): b for b in batch}
+            results = []
+            for future in as_completed(futures):
+                blob = futures[future]
+                try:
+                    results.extend(future.result())
+                    done += 1
+                    source_bytes += blob.size
+                except Exception as exc:
+                    failed += 1
+                    print(f"Skipped {blob.stored_path}: {exc}")
+            derivatives.record(results)
+            elapsed = time.perf_counter() - batch_started
+            print(f"{done} images done, {failed} failed ({len(batch) / elapsed:.1f} images/sec this batch)")
+    finally:
+        db.close()
+        derivatives.shutdown()
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0.0
+    workers = settings.IMAGE_VARIANT_WORKERS
+    print(f"Rendered {done} images ({source_bytes} source bytes) in {elapsed:.1f}s: "
+          f"{rate:.1f} images/sec, {rate / workers:.1f} images/sec per worker process ({workers} workers)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render thumbnail and medium variants for existing images")
+    parser.add_argument("--workers", type=int, help="worker processes (default IMAGE_VARIANT_WORKERS)")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    if args.workers:
+        settings.IMAGE_VARIANT_WORKERS = args.workers
+    backfill(batch_size=args.batch_size)
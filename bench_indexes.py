@@ -0,0 +1,156 @@
+# Seed synthetic rows and report EXPLAIN plans and latencies for the routers' hot queries.
+#
+#   python bench_indexes.py --seed 2000000     # add media rows (and users), then report
+#   python bench_indexes.py                    # report against what is already there
+#   python bench_indexes.py --cleanup          # delete the seeded rows
+#
+# Seeding writes to DATABASE_URL: point it at a scratch database. Seeded rows
+# are tagged (bench-user-*, media under bench/) so --cleanup finds them again.
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, or_, select, tuple_
+
+from app.models import engine
+from app.models.media import Media
+from app.models.user import User
+from app.services import search
+
+SEED_BATCH = 10_000
+WORDS = ("wedding", "birthday", "holiday", "portrait", "family", "school", "beach", "party", "concert", "garden")
+
+
+def seed(conn, media_rows: int, users: int):
+    first_user = (conn.execute(select(func.max(User.user_id))).scalar() or 0) + 1
+    for start in range(0, users, SEED_BATCH):
+        conn.execute(insert(User), [
+            {"user_name": f"bench-user-{first_user + i}", "email": f"bench-user-{first_user + i}@example.invalid", "role": "subscriber", "password": "!"}
+            for i in range(start, min(start + SEED_BATCH, users))
+        ])
+    user_ids = conn.execute(select(User.user_id).where(User.user_name.like("bench-user-%"))).scalars().all()
+    if not user_ids:
+        sys.exit("No bench users to own the media rows; seed with --users > 0")
+    today = date.today()
+    first_id = (conn.execute(select(func.max(Media.id))).scalar() or 0) + 1
+    started = time.monotonic()
+    for start in range(0, media_rows, SEED_BATCH):
+        conn.execute(insert(Media), [
+            {
+                "user_id": random.choice(user_ids),
+                "original_name": f"{random.choice(WORDS)}-{first_id + i}.jpg",
+                "stored_path": f"bench/{first_id + i}.jpg",
+                "media_type": "image",
+                "upload_date": today - timedelta(days=random.randrange(730)),
+                "is_deleted": random.random() < 0.05,
+            }
+            for i in range(start, min(start + SEED_BATCH, media_rows))
+        ])
+        conn.commit()
+        done = min(start + SEED_BATCH, media_rows)
+        print(f"seeded {done}/{media_rows} media rows ({done / (time.monotonic() - started):.0f} rows/s)", end="\r")
+    print()
+    conn.exec_driver_sql("ANALYZE")
+    conn.commit()
+
+
+def cleanup(conn):
+    media = conn.execute(delete(Media).where(Media.stored_path.like("bench/%"))).rowcount
+    users = conn.execute(delete(User).where(User.user_name.like("bench-user-%"))).rowcount
+    conn.commit()
+    print(f"media_deleted: {media}")
+    print(f"users_deleted: {users}")
+
+
+def queries(conn) -> dict:
+    """The routers' hot statements, with parameters drawn from existing rows."""
+    sample = conn.execute(
+        select(Media.user_id, Media.upload_date, Media.updated_at).where(Media.is_deleted == False).limit(1)
+    ).first()
+    if sample is None:
+        sys.exit("No media rows to query; run with --seed first")
+    user_name = conn.execute(select(User.user_name).limit(1)).scalar()
+    paths = conn.execute(select(Media.stored_path).order_by(Media.id.desc()).limit(1000)).scalars().all()
+    statements = {
+        "list_media (user_id, upload_date, live)": select(Media.id, Media.original_name, Media.stored_path)
+        .where(Media.user_id == sample.user_id, Media.upload_date == sample.upload_date, Media.is_deleted == False)
+        .order_by(Media.id),
+        "media_changes (user_id, updated_at, id keyset)": select(Media.id, Media.updated_at)
+        .where(Media.user_id == sample.user_id, tuple_(Media.updated_at, Media.id) > (sample.updated_at - timedelta(days=1), 0))
+        .order_by(Media.updated_at, Media.id)
+        .limit(500),
+        "login (user_name)": select(User.user_id, User.password).where(User.user_name == user_name),
+        "list_users search (ilike '%q%')": select(User.user_id)
+        .where(or_(User.user_name.ilike("%user-12%"), User.email.ilike("%user-12%")))
+        .order_by(User.user_id)
+        .limit(50),
+        "archive stream (upload_date, id over live rows)": select(Media.blob_hash, Media.user_id, Media.upload_date)
+        .where(Media.is_deleted == False, Media.upload_date < date.today() - timedelta(days=365))
+        .order_by(Media.upload_date, Media.id)
+        .limit(1000),
+        "orphan collector (stored_path IN 1000)": select(Media.stored_path).where(Media.stored_path.in_(paths), Media.is_deleted == False),
+        "blob release (blob_hash)": select(Media.id).where(Media.blob_hash == "0" * 64),
+    }
+    if engine.dialect.name == "postgresql":
+        statements["media search (pg_trgm)"] = search._trigram_statement(search.MEDIA, "weding", 10)
+    return statements
+
+
+def explain(conn, stmt) -> list[str]:
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positiontup is not None:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if conn.dialect.name == "postgresql":
+        rows = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}", params).scalars().all()
+    else:
+        rows = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+    conn.rollback()
+    return rows
+
+
+def time_query(conn, stmt, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(stmt).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    conn.rollback()
+    return sorted(timings)
+
+
+def report(conn, repeat: int):
+    print(f"dialect: {engine.dialect.name}")
+    print(f"media_rows: {conn.execute(select(func.count()).select_from(Media)).scalar()}")
+    print(f"users: {conn.execute(select(func.count()).select_from(User)).scalar()}")
+    for name, stmt in queries(conn).items():
+        print(f"\n== {name}")
+        for line in explain(conn, stmt):
+            print(f"   {line}")
+        timings = time_query(conn, stmt, repeat)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"median_ms: {statistics.median(timings):.2f}  p95_ms: {p95:.2f}  max_ms: {timings[-1]:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN plans and latencies for the hot queries")
+    parser.add_argument("--seed", type=int, default=0, help="media rows to add before reporting")
+    parser.add_argument("--users", type=int, default=10_000, help="bench users to add along with --seed")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--cleanup", action="store_true", help="delete the seeded rows and exit")
+    args = parser.parse_args(argv)
+    with engine.connect() as conn:
+        if args.cleanup:
+            cleanup(conn)
+            return
+        if args.seed:
+            seed(conn, args.seed, args.users)
+        report(conn, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import sys
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn, CreateIndex
 from app.models import engine, Base
 from app.models.user import User
 from app.models.roles import *
@@ -5,10 +8,68 @@ from app.models.subscription import MasterSubscription
 from app.models.user_subscription import UserSubscription
 from app.models.media import Media
 from app.models.advertisement import Advertisement
+from app.models.upload_session import UploadSession
+from app.models.cache_version import CacheVersion
+from app.models.blob import Blob
+from app.models.blob_variant import BlobVariant
+from app.models.file_deletion import FileDeletion
+from app.models.stats import PlanStats, UserStats, DailyUploadStats, StatsCounter
 
 def create_all_tables():
     Base.metadata.create_all(bind=engine)
     print("All tables created successfully.")
 
+def add_missing_columns():
+    # create_all() never alters existing tables, so add columns introduced
+    # after a table was first created.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name, schema=table.schema):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name, schema=table.schema)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.fullname} ADD COLUMN {ddl}")
+                print(f"Added column {table.fullname}.{column.name}")
+
+def _index_applies(index, dialect_name):
+    ddl_if = index._ddl_if
+    return ddl_if is None or ddl_if.dialect is None or ddl_if.dialect == dialect_name
+
+def create_missing_indexes():
+    """Add indexes declared on the models to tables that already exist.
+
+    On Postgres each index is built with CREATE INDEX CONCURRENTLY, which does
+    not block writes; it cannot run inside a transaction, so the connection is
+    switched to autocommit. A concurrent build that fails leaves an INVALID
+    index behind, which must be dropped before re-running.
+    """
+    inspector = inspect(engine)
+    is_postgres = engine.dialect.name == "postgresql"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if is_postgres:
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name, schema=table.schema):
+                continue
+            existing = {i["name"] for i in inspector.get_indexes(table.name, schema=table.schema)}
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in existing or not _index_applies(index, engine.dialect.name):
+                    continue
+                if is_postgres:
+                    index.dialect_options["postgresql"]["concurrently"] = True
+                try:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+                finally:
+                    if is_postgres:
+                        index.dialect_options["postgresql"]["concurrently"] = False
+                print(f"Created index {index.name} on {table.fullname}")
+
 if __name__ == "__main__":
-    create_all_tables()
\ No newline at end of file
+    create_all_tables()
+    add_missing_columns()
+    if "--skip-indexes" not in sys.argv:
+        create_missing_indexes()
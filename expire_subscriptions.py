@@ -0,0 +1,7 @@
+from app.services.subscriptions import expire_subscriptions
+
+if __name__ == "__main__":
+    # one-off catch-up (e.g. after enabling the scheduler on a large backlog)
+    report = expire_subscriptions(max_seconds=float("inf"))
+    for key, value in report.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,77 @@
+import hashlib
+import sys
+from pathlib import Path
+from sqlalchemy import func, select
+from app.models import SessionLocal
+from app.models.blob import Blob
+from app.models.media import Media
+from app.models.advertisement import Advertisement
+from app.services.blobs import adopt_file
+from app.services.storage import iter_file, upload_root
+
+BATCH_SIZE = 500
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    size = 0
+    with path.open("rb") as f:
+        for chunk in iter_file(f):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def migrate_model(db, model, dry_run, report, seen):
+    """Move live rows of ``model`` that predate the blob store onto blobs.
+
+    Rows keep their stored_path, so existing URLs still resolve; the file at
+    that path becomes a hard link to the shared blob.
+    """
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(model).where(model.blob_hash.is_(None), model.is_deleted == False, model.id > last_id).order_by(model.id).limit(BATCH_SIZE)
+        ).scalars().all()
+        if not rows:
+            break
+        for row in rows:
+            last_id = row.id
+            path = upload_root() / Path(row.stored_path)
+            if not path.is_file():
+                report["missing"] += 1
+                continue
+            sha256, size = _hash_file(path)
+            report["files"] += 1
+            report["bytes"] += size
+            if dry_run:
+                if sha256 in seen:
+                    report["saved"] += size
+                seen.add(sha256)
+                continue
+            _, deduplicated = adopt_file(db, path, sha256, size)
+            if deduplicated:
+                report["saved"] += size
+            row.blob_hash = sha256
+        if not dry_run:
+            db.commit()
+        print(f"{model.__tablename__}: migrated through id {last_id}")
+
+def migrate_uploads(dry_run=False):
+    db = SessionLocal()
+    try:
+        report = {"files": 0, "missing": 0, "bytes": 0, "saved": 0}
+        # blobs that already exist count as duplicates for the dry-run estimate
+        seen = set(db.execute(select(Blob.sha256)).scalars()) if dry_run else set()
+        for model in (Media, Advertisement):
+            migrate_model(db, model, dry_run, report, seen)
+        verb = "would be" if dry_run else "were"
+        print(f"{report['files']} files ({report['bytes']} bytes) scanned, {report['missing']} missing on disk")
+        print(f"{report['saved']} bytes {verb} reclaimed by replacing duplicate copies")
+        blob_count, stored, referenced = db.execute(
+            select(func.count(), func.coalesce(func.sum(Blob.size), 0), func.coalesce(func.sum(Blob.size * Blob.ref_count), 0))
+        ).one()
+        print(f"Blob store: {blob_count} blobs, {stored} bytes stored for {referenced} bytes referenced ({referenced - stored} bytes saved)")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate_uploads(dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,10 @@
+from app.services.stats import reconcile_stats
+
+if __name__ == "__main__":
+    # run once after creating the stats tables to fill them, then the scheduler keeps them current
+    report = reconcile_stats()
+    if report is None:
+        print("Another worker is reconciling the stats tables")
+    else:
+        for key, value in report.items():
+            print(f"{key}: {value}")
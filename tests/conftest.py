@@ -0,0 +1,87 @@
+# Test setup: a throwaway SQLite database and file storage per test session.
+#
+# Settings are read from the environment at import time, so they are set here
+# before anything under app/ is imported. SQLite has no schemas; the models'
+# "public" schema is an attached database.
+import os
+import shutil
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="pbs-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/main.db"
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-the-pytest-suite")
+for _name, _dir in (("UPLOADS_DIR", "uploads"), ("UPLOAD_SESSIONS_DIR", "upload_sessions"), ("ARCHIVE_DIR", "archive")):
+    os.environ[_name] = os.path.join(_workdir, _dir)
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.models import Base, SessionLocal, engine
+
+
+@event.listens_for(engine, "connect")
+def _attach_public(dbapi_connection, record):
+    dbapi_connection.execute(f"ATTACH DATABASE '{_workdir}/public.db' AS public")
+
+
+import create_tables  # registers every model on Base.metadata
+from app.main import app
+from app.services import passwords, subscriptions, tokens
+from app.services.catalog import subscription_catalog
+
+
+@pytest.fixture(autouse=True)
+def fresh_database():
+    """Every test starts from empty tables and empty process-local caches."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    tokens.user_cache.clear()
+    subscriptions.entitlement_cache.clear()
+    subscription_catalog.invalidate()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def login(client, user_name: str, password: str) -> dict:
+    response = client.post("/dashboard/login", json={"user_name": user_name, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def upload(client, headers, user_id: int, name: str, content: bytes) -> dict:
+    """Upload one file through the dashboard and return its created item."""
+    response = client.post(
+        "/dashboard/media",
+        data={"user_id": str(user_id), "date": "2024-05-01"},
+        files=[("files", (name, content, "text/plain"))],
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["created"][0]
+
+
+@pytest.fixture
+def admin(client) -> dict:
+    """Auth headers for a freshly created super_admin."""
+    client.post("/dashboard/add-user", json={"user_name": "admin", "email": "admin@example.com", "role": "super_admin", "password": "secret"})
+    return login(client, "admin", "secret")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    passwords.shutdown()
+    engine.dispose()
+    shutil.rmtree(_workdir, ignore_errors=True)
@@ -0,0 +1,52 @@
+import hashlib
+
+import pytest
+from sqlalchemy import select
+
+from app.models.blob import Blob
+from app.services import stats
+from app.services.blobs import blob_path
+from app.services.storage import upload_root
+
+from conftest import upload
+
+
+def test_identical_uploads_share_one_blob(db, client, admin):
+    first = upload(client, admin, 10, "a.txt", b"same bytes")
+    second = upload(client, admin, 11, "b.txt", b"same bytes")
+
+    blob = db.execute(select(Blob)).scalar_one()
+    assert blob.ref_count == 2
+    assert first["url"].split("?")[0] == second["url"].split("?")[0]
+    assert (upload_root() / blob.stored_path).read_bytes() == b"same bytes"
+
+
+def test_deleting_twice_releases_once(db, client, admin):
+    first = upload(client, admin, 10, "a.txt", b"twice")
+    upload(client, admin, 11, "b.txt", b"twice")
+
+    client.delete(f"/dashboard/media/{first['id']}", headers=admin)
+    client.delete(f"/dashboard/media/{first['id']}", headers=admin)
+
+    db.expire_all()
+    assert db.execute(select(Blob.ref_count)).scalar_one() == 1
+
+
+def test_failed_upload_removes_the_blob_file_it_placed(db, client, admin, monkeypatch):
+    upload(client, admin, 10, "kept.txt", b"already stored")
+
+    def fail(*args):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(stats, "media_added", fail)
+    with pytest.raises(RuntimeError):
+        client.post(
+            "/dashboard/media",
+            data={"user_id": "11", "date": "2024-05-01"},
+            files=[("files", ("new.txt", b"new bytes", "text/plain")), ("files", ("again.txt", b"already stored", "text/plain"))],
+            headers=admin,
+        )
+
+    stored = db.execute(select(Blob.stored_path)).scalar_one()
+    assert (upload_root() / stored).read_bytes() == b"already stored"
+    assert not (upload_root() / blob_path(hashlib.sha256(b"new bytes").hexdigest(), ".txt")).exists()
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from datetime import date
+
+from sqlalchemy import event, insert, select
+
+from app.api.dashboard.exports import MEDIA_EXPORT_FIELDS
+from app.config.config import settings
+from app.models import engine
+from app.models.media import Media
+from app.services.exports import iter_export
+from app.services.pagination import projection
+
+
+def add_media(db, *names, upload_date=date(2024, 5, 1)):
+    db.execute(insert(Media), [
+        {"user_id": 10, "original_name": name, "stored_path": f"docs/{i}.txt", "media_type": "document", "upload_date": upload_date}
+        for i, name in enumerate(names)
+    ])
+    db.commit()
+
+
+def test_csv_export_quotes_cells_a_spreadsheet_would_evaluate(db, client, admin):
+    add_media(db, '=HYPERLINK("http://evil.example","x")', "+1", "-2", "@SUM(A1)", "plain.jpg", "mid=dle.jpg")
+
+    response = client.get("/dashboard/export/media", params={"format": "csv", "fields": "original_name"}, headers=admin)
+
+    assert response.status_code == 200
+    assert [row[0] for row in csv.reader(io.StringIO(response.text))] == [
+        "original_name", '\'=HYPERLINK("http://evil.example","x")', "'+1", "'-2", "'@SUM(A1)", "plain.jpg", "mid=dle.jpg",
+    ]
+
+
+def test_media_export_filters_by_exact_date(db, client, admin):
+    add_media(db, "may.jpg")
+    add_media(db, "june.jpg", upload_date=date(2024, 6, 1))
+
+    response = client.get("/dashboard/export/media", params={"date": "2024-06-01", "fields": "original_name"}, headers=admin)
+
+    assert response.status_code == 200
+    assert response.text.splitlines() == ['{"original_name":"june.jpg"}']
+
+
+def test_export_is_fetched_and_encoded_in_batches(db, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 10)
+    add_media(db, *(f"{i}.jpg" for i in range(25)))
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM public.media" in statement:
+            executed.append(context.execution_options.get("yield_per"))
+
+    event.listen(engine, "after_cursor_execute", record)
+    try:
+        names = ["id", "original_name"]
+        stmt = select(*projection(MEDIA_EXPORT_FIELDS, names, Media.id)).order_by(Media.id)
+        chunks = list(iter_export(stmt, MEDIA_EXPORT_FIELDS, names, "ndjson"))
+    finally:
+        event.remove(engine, "after_cursor_execute", record)
+
+    # one query, read through yield_per and encoded one partition at a time
+    assert executed == [10]
+    assert [len(chunk.splitlines()) for chunk in chunks] == [10, 10, 5]
+    assert json.loads(chunks[-1].splitlines()[-1]) == {"id": 25, "original_name": "24.jpg"}
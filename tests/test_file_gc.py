@@ -0,0 +1,78 @@
+import os
+import time
+
+from sqlalchemy import delete, func, select
+
+from app.config.config import settings
+from app.models.blob import Blob
+from app.models.file_deletion import FileDeletion
+from app.models.media import Media
+from app.services import blobs, file_gc
+from app.services.storage import upload_root
+
+from conftest import upload
+
+
+def test_last_release_queues_the_file_for_deferred_deletion(db, client, admin):
+    first = upload(client, admin, 10, "a.txt", b"shared")
+    second = upload(client, admin, 11, "b.txt", b"shared")
+    stored_path = db.execute(select(Blob.stored_path)).scalar_one()
+    hot_copy = upload_root() / stored_path
+
+    assert client.delete(f"/dashboard/media/{first['id']}", headers=admin).status_code == 200
+    db.expire_all()
+    assert db.execute(select(Blob.ref_count)).scalar_one() == 1
+    assert hot_copy.exists()
+    assert db.execute(select(func.count()).select_from(FileDeletion)).scalar() == 0
+
+    assert client.delete(f"/dashboard/media/{second['id']}", headers=admin).status_code == 200
+    db.expire_all()
+    assert db.execute(select(func.count()).select_from(Blob)).scalar() == 0
+    # moved aside at once so it stops being served, removed later by the worker
+    assert not hot_copy.exists()
+    assert client.get(second["url"]).status_code == 404
+    queued = db.execute(select(FileDeletion.stored_path)).scalars().all()
+    assert len(queued) == 1
+    assert (upload_root() / queued[0]).exists()
+
+    deleted, reclaimed = file_gc.process_deletions()
+
+    assert (deleted, reclaimed) == (1, len(b"shared"))
+    assert not (upload_root() / queued[0]).exists()
+    db.expire_all()
+    assert db.execute(select(func.count()).select_from(FileDeletion)).scalar() == 0
+
+
+def test_orphan_collector_leaves_trash_to_the_deletion_queue(db, client, admin):
+    media = upload(client, admin, 10, "a.txt", b"released")
+    keep = upload(client, admin, 11, "b.txt", b"kept")
+    hot_copy = upload_root() / db.execute(select(Blob.stored_path).where(Blob.size == len(b"released"))).scalar_one()
+    old = time.time() - settings.ORPHAN_GC_GRACE_SECONDS - 60
+    os.utime(hot_copy, (old, old))
+
+    # moved to trash but not yet committed: neither referenced nor queued anywhere the collector can see
+    row = db.get(Media, media["id"])
+    row.is_deleted = True
+    pending = blobs.release(db, row)
+    (trash, _), = pending.moved
+    db.flush()
+    file_gc.collect_orphans()
+    assert trash.exists()
+
+    db.rollback()
+    pending.undo()
+    assert hot_copy.exists()
+
+    # queued trash stays the worker's, even once it is past the grace period
+    assert client.delete(f"/dashboard/media/{media['id']}", headers=admin).status_code == 200
+    queued = upload_root() / db.execute(select(FileDeletion.stored_path)).scalar_one()
+    os.utime(queued, (old, old))
+    file_gc.collect_orphans()
+    assert queued.exists()
+
+    # once the worker gives up on it, the collector removes it
+    db.execute(delete(FileDeletion))
+    db.commit()
+    file_gc.collect_orphans()
+    assert not queued.exists()
+    assert client.get(keep["url"]).status_code == 200
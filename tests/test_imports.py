@@ -0,0 +1,84 @@
+import io
+import json
+
+from sqlalchemy import func, select
+
+from app.models.user import User
+from app.services import passwords
+from app.services.imports import import_users
+
+CSV = (
+    "user_name,email,role,password\n"
+    "alice,alice@example.com,subscriber,pw1\n"
+    "bob,not-an-email,subscriber,pw2\n"
+    "alice,alice2@example.com,subscriber,pw3\n"
+    "taken,taken@example.com,subscriber,pw4\n"
+    "carol,carol@example.com,subscriber,pw5,extra\n"
+    "dave,dave@example.com,subscriber,pw6\n"
+)
+
+
+def errors_by_row(report) -> dict:
+    return {error["row"]: error["errors"] for error in report["errors"]}
+
+
+def test_import_reports_each_failed_row(db, client, admin):
+    client.post("/dashboard/add-user", json={"user_name": "taken", "email": "taken@example.com", "role": "subscriber", "password": "pw"})
+
+    report = import_users(io.BytesIO(CSV.encode()), "csv", added_by=1)
+
+    assert report["received"] == 6
+    assert report["created"] == 2
+    assert report["failed"] == 4
+    errors = errors_by_row(report)
+    assert sorted(errors) == [2, 3, 4, 5]
+    assert errors[2][0].startswith("email:")
+    assert errors[3] == ["user_name: duplicate in file"]
+    assert errors[4] == ["user_name or email already exists"]
+    assert errors[5] == ["More values than header columns"]
+    imported = {u.user_name: u for u in db.execute(select(User).where(User.user_name.in_(["alice", "dave"]))).scalars()}
+    assert sorted(imported) == ["alice", "dave"]
+    assert passwords.verify_password_sync("pw1", imported["alice"].password)
+
+
+def test_ndjson_rows_are_numbered_by_line_and_unknown_plans_rejected():
+    lines = [
+        json.dumps({"user_name": "erin", "email": "erin@example.com", "role": "subscriber", "password": "pw"}),
+        "{not json",
+        json.dumps(["a", "list"]),
+        json.dumps({"user_name": "frank", "email": "frank@example.com", "role": "subscriber", "password": "pw", "subscription_id": 999}),
+    ]
+
+    report = import_users(io.BytesIO("\n".join(lines).encode()), "ndjson", added_by=1)
+
+    assert report["created"] == 1
+    assert errors_by_row(report) == {
+        2: ["Invalid JSON"],
+        3: ["Expected a JSON object"],
+        4: ["subscription_id: unknown subscription", "end_date: required with subscription_id"],
+    }
+
+
+def test_dry_run_validates_without_writing(db):
+    report = import_users(io.BytesIO(CSV.encode()), "csv", added_by=1, dry_run=True)
+
+    assert report["dry_run"] is True
+    assert report["valid"] == 3
+    assert report["created"] == 0
+    assert db.execute(select(func.count()).select_from(User)).scalar() == 0
+
+
+def test_import_endpoint_infers_the_format(client, admin):
+    response = client.post(
+        "/dashboard/import/users",
+        files={"file": ("users.csv", CSV.encode(), "application/octet-stream")},
+        headers=admin,
+    )
+
+    assert response.status_code == 200
+    assert response.json()["created"] == 3
+    assert client.post(
+        "/dashboard/import/users",
+        files={"file": ("users.bin", CSV.encode(), "application/octet-stream")},
+        headers=admin,
+    ).status_code == 400
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.config.config import settings
+from app.models.media import Media
+
+from conftest import upload
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def no_sync_lag(monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_LAG_SECONDS", 0)
+
+
+def subscriber(client, admin, user_name: str) -> tuple[int, dict]:
+    client.post("/dashboard/add-user", json={"user_name": user_name, "email": f"{user_name}@example.com", "role": "subscriber", "password": "pw"}, headers=admin)
+    response = client.post("/mobile/login", json={"user_name": user_name, "password": "pw"})
+    assert response.status_code == 200, response.text
+    return int(response.json()["user_id"]), {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def stamp(db, media_id: int, at: datetime):
+    # updated_at has one-second resolution on SQLite; pin it so the order is deterministic
+    db.execute(update(Media).where(Media.id == media_id).values(updated_at=at))
+    db.commit()
+
+
+def sync(client, headers, user_id: int, cursor: str | None, limit: int = 500) -> tuple[list[dict], str]:
+    """Page through /mobile/media/changes until has_more is false, like a device does."""
+    changes = []
+    while True:
+        params = {"user_id": user_id, "limit": limit}
+        if cursor:
+            params["since"] = cursor
+        response = client.get("/mobile/media/changes", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        changes += body["changes"]
+        cursor = body["next_cursor"]
+        if not body["has_more"]:
+            return changes, cursor
+
+
+def test_devices_sync_changes_and_tombstones_from_their_own_cursors(db, client, admin):
+    user_id, headers = subscriber(client, admin, "sam")
+    first = [upload(client, admin, user_id, f"{i}.txt", f"file {i}".encode()) for i in range(3)]
+    for i, item in enumerate(first):
+        stamp(db, item["id"], T0 + timedelta(seconds=i))
+
+    # a phone pages through in twos, a tablet takes everything at once
+    phone, phone_cursor = sync(client, headers, user_id, None, limit=2)
+    tablet, tablet_cursor = sync(client, headers, user_id, None)
+    assert [c["id"] for c in phone] == [c["id"] for c in tablet] == [item["id"] for item in first]
+    assert all(not c["is_deleted"] and "sig=" in c["url"] for c in phone)
+
+    assert client.delete(f"/dashboard/media/{first[0]['id']}", headers=admin).status_code == 200
+    stamp(db, first[0]["id"], T0 + timedelta(seconds=10))
+    added = upload(client, admin, user_id, "new.txt", b"new file")
+    stamp(db, added["id"], T0 + timedelta(seconds=11))
+
+    phone, phone_cursor = sync(client, headers, user_id, phone_cursor, limit=1)
+    assert phone == [
+        {"id": first[0]["id"], "is_deleted": True, "updated_at": "2024-05-01T12:00:10"},
+        {**phone[1], "id": added["id"], "is_deleted": False},
+    ]
+    # the tablet was not online in between and catches up on the same changes
+    tablet, tablet_cursor = sync(client, headers, user_id, tablet_cursor)
+    assert tablet == phone
+
+    # nothing new: an empty page hands the cursor back
+    assert sync(client, headers, user_id, phone_cursor) == ([], phone_cursor)
+    # a fresh install gets the live set only, without tombstones
+    fresh, _ = sync(client, headers, user_id, None)
+    assert [c["id"] for c in fresh] == [first[1]["id"], first[2]["id"], added["id"]]
+
+
+def test_changes_are_only_served_to_the_subscriber_they_belong_to(client, admin):
+    user_id, headers = subscriber(client, admin, "sam")
+    other_id, other_headers = subscriber(client, admin, "kim")
+    upload(client, admin, user_id, "a.txt", b"private")
+
+    assert client.get("/mobile/media/changes", params={"user_id": user_id}).status_code in (401, 403)
+    assert client.get("/mobile/media/changes", params={"user_id": user_id}, headers=other_headers).status_code == 403
+    assert client.get("/mobile/media", params={"user_id": user_id, "date": "2024-05-01"}, headers=other_headers).status_code == 403
+    assert client.get("/mobile/entitlement", params={"user_id": user_id}, headers=other_headers).status_code == 403
+    assert client.get("/mobile/media/changes", params={"user_id": user_id}, headers=admin).status_code == 403
+    assert client.get("/mobile/entitlement", params={"user_id": other_id}, headers=other_headers).status_code == 200
+    assert client.get("/mobile/media/changes", params={"user_id": user_id}, headers=headers).status_code == 200
@@ -0,0 +1,30 @@
+import pytest
+
+from app.config.config import settings
+from app.services import passwords
+
+
+def test_password_change_is_hashed_on_the_bounded_pool(client, admin, monkeypatch):
+    user_id = client.get("/dashboard/users", headers=admin).json()[0]["user_id"]
+    # a saturated pool sheds the request instead of queueing it on the generic threadpool
+    monkeypatch.setattr(passwords, "_pending", settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE)
+
+    response = client.put(f"/dashboard/users/{user_id}", json={"password": "changed"}, headers=admin)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_shutdown_stops_both_executors():
+    passwords.hash_passwords_bulk(["pw"])
+    executor = passwords._get_executor()
+    bulk = passwords._get_bulk_executor()
+
+    passwords.shutdown()
+
+    for stopped in (executor, bulk):
+        with pytest.raises(RuntimeError):
+            stopped.submit(print)
+    assert passwords._executor is None and passwords._bulk_executor is None
+    # the next login starts a fresh pool
+    assert passwords.verify_password_sync("pw", passwords.hash_passwords_bulk(["pw"])[0])
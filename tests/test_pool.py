@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+
+from app.models.pool import InstrumentedQueuePool, pool_metrics
+
+
+def counters() -> tuple[int, int, int]:
+    snapshot = pool_metrics.snapshot()
+    return snapshot["checkouts"], snapshot["checkout_timeouts"], snapshot["checkout_errors"]
+
+
+def test_only_pool_timeouts_count_as_timeouts():
+    pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.01)
+    checkouts, timeouts, errors = counters()
+
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+
+    assert counters() == (checkouts + 1, timeouts + 1, errors)
+    assert pool_metrics.snapshot()["waiting"] == 0
+
+
+def test_connect_errors_are_not_counted_as_timeouts():
+    def refuse():
+        raise sqlite3.OperationalError("connection refused")
+
+    pool = InstrumentedQueuePool(refuse, pool_size=1, max_overflow=0)
+    checkouts, timeouts, errors = counters()
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connect()
+
+    assert counters() == (checkouts, timeouts, errors + 1)
+    assert pool_metrics.snapshot()["waiting"] == 0
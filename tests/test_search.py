@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, update
+
+from app.models.media import Media
+from app.models.user import User
+from app.services import search
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def add_users(db, *names):
+    db.execute(insert(User), [
+        {"user_name": name, "email": f"{name}@example.com", "role": "subscriber", "password": "!", "updated_at": T0}
+        for name in names
+    ])
+    db.commit()
+
+
+def names(hits) -> list[str]:
+    return [hit["user_name"] for hit in hits]
+
+
+def test_prefix_beats_substring_beats_typo():
+    assert search.rank("mar", ["maria"]) > search.rank("mar", ["omar"]) > 0
+    assert search.rank("jonathon", ["jonathan"]) is not None
+    assert search.rank("jonathon", ["beatrice"]) is None
+    # the best of several fields counts
+    assert search.rank("example", ["zed", "zed@example.com"]) == search.rank("example", ["zed@example.com"])
+
+
+def test_index_ranks_prefix_substring_and_typo_matches(db):
+    add_users(db, "maria", "omar", "marianne", "jonathan", "beatrice")
+    index = search.TrigramIndex(search.USERS)
+    index.refresh()
+
+    assert names(index.search("mar", 10)) == ["maria", "marianne", "omar"]
+    assert names(index.search("jonathon", 10)) == ["jonathan"]
+    assert names(index.search("maria", 1)) == ["maria"]
+    assert index.search("zzz", 10) == []
+
+
+def test_index_refresh_applies_changes_incrementally(db):
+    add_users(db, "maria", "omar")
+    index = search.TrigramIndex(search.USERS)
+    index.refresh()
+    assert index.stats()["builds"] == 1
+
+    add_users(db, "marco")
+    db.execute(update(User).where(User.user_name == "omar").values(user_name="oscar", email="oscar@example.com", updated_at=T0 + timedelta(seconds=5)))
+    db.commit()
+    index.refresh()
+
+    # equal ranks keep id order
+    assert names(index.search("mar", 10)) == ["maria", "marco"]
+    assert names(index.search("oscar", 10)) == ["oscar"]
+    stats = index.stats()
+    assert (stats["docs"], stats["builds"], stats["updates"]) == (3, 1, 1)
+
+    # a hard DELETE leaves nothing to apply incrementally: the count mismatch forces a rebuild
+    db.execute(delete(User).where(User.user_name == "maria"))
+    db.commit()
+    index.refresh()
+
+    assert names(index.search("mar", 10)) == ["marco"]
+    assert index.stats()["builds"] == 2
+
+
+def test_soft_deleted_media_drops_out_of_the_index(db):
+    db.execute(insert(Media), [
+        {"user_id": 10, "original_name": name, "stored_path": f"docs/{name}", "media_type": "image", "upload_date": T0.date(), "updated_at": T0}
+        for name in ("wedding-1.jpg", "wedding-2.jpg")
+    ])
+    db.commit()
+    index = search.TrigramIndex(search.MEDIA)
+    index.refresh()
+    assert [hit["original_name"] for hit in index.search("weding", 10)] == ["wedding-1.jpg", "wedding-2.jpg"]
+
+    db.execute(update(Media).where(Media.original_name == "wedding-1.jpg").values(is_deleted=True, updated_at=T0 + timedelta(seconds=5)))
+    db.commit()
+    index.refresh()
+
+    hits = index.search("weding", 10)
+    assert [hit["original_name"] for hit in hits] == ["wedding-2.jpg"]
+    assert "sig=" in hits[0]["url"]
+    assert index.stats()["builds"] == 1
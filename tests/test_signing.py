@@ -0,0 +1,42 @@
+import time
+
+from app.services import signing
+from app.services.storage import upload_root
+
+
+def test_signed_url_verifies():
+    expires = int(time.time()) + 60
+    params = signing.sign("blobs/ab/cd/file.jpg", expires)
+
+    assert signing.verify("blobs/ab/cd/file.jpg", params["exp"], params["kid"], params["sig"]) == expires
+
+
+def test_signature_is_bound_to_path_and_expiry():
+    expires = int(time.time()) + 60
+    params = signing.sign("blobs/ab/cd/file.jpg", expires)
+
+    assert signing.verify("blobs/ab/cd/other.jpg", params["exp"], params["kid"], params["sig"]) is None
+    assert signing.verify("blobs/ab/cd/file.jpg", str(expires + 1), params["kid"], params["sig"]) is None
+    assert signing.verify("blobs/ab/cd/file.jpg", params["exp"], "unknown", params["sig"]) is None
+    assert signing.verify("blobs/ab/cd/file.jpg", params["exp"], params["kid"], None) is None
+
+
+def test_expired_url_is_rejected():
+    expires = int(time.time()) - 1
+    params = signing.sign("file.jpg", expires)
+
+    assert signing.verify("file.jpg", params["exp"], params["kid"], params["sig"]) is None
+
+
+def test_file_route_requires_a_valid_signature(client):
+    dest = upload_root() / "docs" / "note.txt"
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.write_bytes(b"hello")
+    url = signing.media_url("docs/note.txt")
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == b"hello"
+
+    assert client.get(url.replace("sig=", "sig=x")).status_code == 403
+    assert client.get("/uploads/docs/note.txt").status_code == 403
@@ -0,0 +1,50 @@
+from sqlalchemy import select
+
+from app.models import SessionLocal
+from app.models.user import User
+from app.services.tokens import revoke_tokens
+
+from conftest import login
+
+
+def test_login_revokes_earlier_tokens(client, admin):
+    second = login(client, "admin", "secret")
+
+    assert client.get("/dashboard/diagnostics", headers=admin).status_code == 401
+    assert client.get("/dashboard/diagnostics", headers=second).status_code == 200
+
+
+def test_password_change_revokes_tokens(client, admin):
+    user_id = client.get("/dashboard/users", headers=admin).json()[0]["user_id"]
+
+    response = client.put(f"/dashboard/users/{user_id}", json={"password": "changed"}, headers=admin)
+
+    assert response.status_code == 200
+    assert client.get("/dashboard/diagnostics", headers=admin).status_code == 401
+    assert client.get("/dashboard/diagnostics", headers=login(client, "admin", "changed")).status_code == 200
+
+
+def test_revoke_tokens_increments_in_the_database(db, client, admin):
+    user = db.execute(select(User).where(User.user_name == "admin")).scalar_one()
+    before = user.token_version
+
+    # a second session holding a stale copy of the row still gets the next version
+    other = SessionLocal()
+    try:
+        stale = other.get(User, user.user_id)
+        assert revoke_tokens(db, user) == before + 1
+        db.commit()
+        assert revoke_tokens(other, stale) == before + 2
+        other.commit()
+    finally:
+        other.close()
+
+    db.expire_all()
+    assert db.get(User, user.user_id).token_version == before + 2
+
+
+def test_tampered_token_is_rejected(client, admin):
+    token = admin["Authorization"]
+    forged = {"Authorization": token[:-2] + ("AA" if not token.endswith("AA") else "BB")}
+
+    assert client.get("/dashboard/diagnostics", headers=forged).status_code == 401